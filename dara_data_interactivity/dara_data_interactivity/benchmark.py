@@ -0,0 +1,125 @@
+"""
+Copyright 2023 Impulse Innovations Limited
+
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Headless latency benchmark of the interactions on the Data Interactivity page.
+
+Run from the root directory of the project with:
+
+    poetry run python -m dara_data_interactivity.benchmark
+
+Every interaction calls the body of a py_component of DataInteractivityPage directly, exactly as Dara does when
+the selected rows, variable or comparison switch change, including building the Bokeh document shipped to the
+browser. Selections larger than the dataset are sampled with replacement.
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from dara_data_interactivity.data_interactivity import DataInteractivityPage
+from dara_data_interactivity.definitions import DATA_SOURCE, FEATURES
+
+DEFAULT_SELECTION_SIZES = [1, 10, 1000, 100000]
+
+
+def select_rows(data: pd.DataFrame, size: int, seed: int = 0) -> List[dict]:
+    """
+    Builds a selection of rows in the format the Table sends them to the page.
+
+    :param data: DataFrame hosting the data in question
+    :param size: the number of rows to select
+    :param seed: seed of the random sample
+    :return: the selected rows as a list of records
+    """
+    return data.sample(size, replace=size > len(data), random_state=seed).to_dict('records')
+
+
+def measure(interaction: Callable[[], object], repeats: int) -> Dict[str, float]:
+    """
+    Measures the latency and memory allocated by an interaction.
+
+    Latencies are timed with tracing disabled, then the interaction is run once more under tracemalloc so that the
+    tracing overhead does not skew the timings.
+
+    :param interaction: the interaction to measure
+    :param repeats: the number of timed runs
+    :return: dictionary with the p50 and p95 latency in milliseconds and the peak allocations in MiB
+    """
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        interaction()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    interaction()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50 (ms)': np.percentile(latencies, 50),
+        'p95 (ms)': np.percentile(latencies, 95),
+        'peak alloc (MiB)': peak / 2**20,
+    }
+
+
+def run_benchmark(sizes: List[int], features: List[str], repeats: int) -> pd.DataFrame:
+    """
+    Drives the page through every selection size and, for each, switches through the given features.
+
+    :param sizes: the numbers of selected rows to benchmark
+    :param features: the features to switch the distribution plot to
+    :param repeats: the number of timed runs of each interaction
+    :return: DataFrame with one row per interaction
+    """
+    page = DataInteractivityPage()
+    plot_selected_rows = DataInteractivityPage.plot_selected_rows.__wrapped__
+    descriptive_stats = DataInteractivityPage.descriptive_stats.__wrapped__
+    data = DATA_SOURCE.data
+
+    results = []
+    for size in sizes:
+        rows = select_rows(data, size)
+        results.append({
+            'rows': size,
+            'interaction': 'descriptive_stats',
+            **measure(lambda: descriptive_stats(page, rows), repeats),
+        })
+        for feature in features:
+            for compare in ([False, True] if size > 1 else [False]):
+                results.append({
+                    'rows': size,
+                    'interaction': f"plot_selected_rows({feature}{', compare' if compare else ''})",
+                    **measure(lambda: plot_selected_rows(page, rows, feature, compare, data), repeats),
+                })
+
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the interactions on the Data Interactivity page.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SELECTION_SIZES,
+                        help='numbers of selected rows to benchmark')
+    parser.add_argument('--features', nargs='+', default=FEATURES, help='features to switch the plot to')
+    parser.add_argument('--repeats', type=int, default=20, help='number of timed runs of each interaction')
+    args = parser.parse_args()
+
+    report = run_benchmark(args.sizes, args.features, args.repeats)
+    with pd.option_context('display.max_rows', None, 'display.width', None, 'display.float_format', '{:.2f}'.format):
+        print(report.to_string(index=False))
@@ -22,16 +22,17 @@ import pandas as pd
 
 from dara.core import py_component, UpdateVariable, Variable, DataVariable
 from dara.core.definitions import ComponentInstance
-from dara.components import Bokeh, Stack, Table, Select, Grid, Spacer, Card, Text, Heading
+from dara.components import Bokeh, Stack, Table, Select, Switch, Grid, Spacer, Card, Text, Heading
 
 from dara_data_interactivity.definitions import DATA, FEATURES, CATEGORICAL_FEATURES, GREEN, RED
-from dara_data_interactivity.plotting_utils import plot_distribution
+from dara_data_interactivity.plotting_utils import plot_comparison, plot_distribution
 
 
 class DataInteractivityPage:
     def __init__(self) -> None:
         self.selected_rows = Variable([])
         self.graph_view = Variable('Total Wealth')
+        self.compare_to_population = Variable(False)
 
     def __call__(self) -> ComponentInstance:
         """
@@ -60,7 +61,7 @@ class DataInteractivityPage:
                 height='40%'
             ),
             Stack(
-                self.plot_selected_rows(self.selected_rows, self.graph_view, DATA),
+                self.plot_selected_rows(self.selected_rows, self.graph_view, self.compare_to_population, DATA),
                 self.descriptive_stats(self.selected_rows),
                 direction='horizontal'    
             ),
@@ -120,16 +121,17 @@ class DataInteractivityPage:
         return columns
 
     @py_component
-    def plot_selected_rows(self, rows: List[dict], view: str, data: pd.DataFrame) -> ComponentInstance:
+    def plot_selected_rows(self, rows: List[dict], view: str, compare: bool, data: pd.DataFrame) -> ComponentInstance:
         """
         Plots a distribution plot of the selected variable.
 
         If one individual from the table is selected it will plot the whole data and highlight the individual
         in a different color. If multiple individuals are selected it will plot the collective distributions of
-        the individuals chosen.
+        the individuals chosen, optionally over the distribution of the whole data.
 
         :param rows: the information from the row(s) selected in the Table
         :param view: the feature chosen of which to view the distribution
+        :param compare: whether to plot the distribution of multiple individuals over the whole data
         :param data: DataFrame hosting the data in question
         :return: ComponentInstance
         """
@@ -137,16 +139,21 @@ class DataInteractivityPage:
             # display nothing if rows haven't been selected
             return Stack()
 
+        controls = [Text('Variable:'), Select(value=self.graph_view, items=FEATURES)]
         if len(rows) == 1:
             graph = plot_distribution(data, view, rows[0])
             help_text = 'Bars that are orange indicate that the selected data point lives within this range.'
         else:
-            graph = plot_distribution(pd.DataFrame(rows), view)
-            help_text = ''
+            controls += [Text('Compare with whole dataset:'), Switch(value=self.compare_to_population)]
+            if compare:
+                graph = plot_comparison(data, pd.DataFrame(rows), view)
+                help_text = 'Bars show the share of the whole dataset and of the selected individuals in each range.'
+            else:
+                graph = plot_distribution(pd.DataFrame(rows), view)
+                help_text = ''
         return Stack(
             Stack(
-                Text('Variable:'),
-                Select(value=self.graph_view, items=FEATURES),
+                *controls,
                 direction='horizontal',
                 height='7%'
             ),
@@ -0,0 +1,135 @@
+"""
+Copyright 2023 Impulse Innovations Limited
+
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+
+from dara.core import DataVariable
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path: str) -> Tuple[int, int]:
+    """
+    Cheap fingerprint of a file used to decide whether it is worth hashing it again.
+
+    :param path: path to the file
+    :return: tuple of the modification time (in nanoseconds) and the size of the file
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Hashes the contents of a file in chunks so that large files are never held in memory twice.
+
+    :param path: path to the file
+    :param chunk_size: number of bytes read at a time
+    :return: the hex SHA-256 digest of the file
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WatchedDataSource:
+    """
+    Keeps a DataVariable in sync with a file on disk.
+
+    The file is polled for changes to its modification time or size, and only when those change is the content
+    hashed to rule out a plain `touch`. A changed file is parsed in a worker thread while the current data keeps
+    being served, and the DataVariable is then swapped to the new DataFrame in a single write which notifies
+    connected clients. A file that fails to load, or whose columns no longer match the ones the page was built
+    with, is ignored so that the app keeps serving the last good version.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        loader: Callable[[str], pd.DataFrame],
+        columns: Optional[List[str]] = None,
+        interval: float = 5.0,
+    ) -> None:
+        """
+        :param path: path to the file backing the data
+        :param loader: function parsing the file at the given path into a DataFrame
+        :param columns: the columns any new version of the data must have, defaults to the columns of the first load
+        :param interval: number of seconds between checks of the file
+        """
+        self.path = path
+        self.loader = loader
+        self.interval = interval
+
+        self._signature = file_signature(path)
+        self._digest = file_digest(path)
+        self.data = loader(path)
+        self.columns = columns if columns is not None else [*self.data.columns]
+        self.variable = DataVariable(self.data)
+
+    def _load_if_changed(self) -> Optional[pd.DataFrame]:
+        """
+        Loads the file if its content changed since the last successful load.
+
+        This does blocking IO and parsing, so it is run in a worker thread by `watch`.
+
+        :return: the new DataFrame, or None if the data should not be swapped
+        """
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return None
+        self._signature = signature
+
+        digest = file_digest(self.path)
+        if digest == self._digest:
+            return None
+
+        data = self.loader(self.path)
+        if [*data.columns] != self.columns:
+            logger.warning('Ignoring %s as its columns changed from %s to %s', self.path, self.columns, [*data.columns])
+            return None
+
+        self._digest = digest
+        return data
+
+    async def watch(self):
+        """Polls the file forever, swapping the DataVariable contents whenever a new version is loaded."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                data = await asyncio.get_running_loop().run_in_executor(None, self._load_if_changed)
+            except Exception:
+                logger.exception('Failed to reload %s, keeping the previous version', self.path)
+                continue
+            if data is not None:
+                self.data = data
+                await self.variable.write(data)
+
+    async def start(self) -> Callable[[], None]:
+        """
+        Starts watching the file in the background, meant to be registered with `config.on_startup`.
+
+        :return: a cleanup function stopping the watcher
+        """
+        task = asyncio.create_task(self.watch())
+        return task.cancel
@@ -17,16 +17,32 @@ limitations under the License.
 import os
 import pandas as pd
 
-from dara.core import DataVariable
+from dara_data_interactivity.data_source import WatchedDataSource
 
 DATA_ROOT = os.environ.get('DATA_ROOT', './data')
 
-data = pd.read_csv(os.path.join(DATA_ROOT, '401k.csv'), index_col=0)
-data['Income Bracket'] = pd.qcut(data['Income'], 4, labels=['Below Q1', 'Above Q1', 'Above Q2', 'Above Q3'])
+# number of seconds between checks of the dataset file for changes
+DATA_POLL_INTERVAL = float(os.environ.get('DATA_POLL_INTERVAL', 5))
 
-DATA = DataVariable(data)
-FEATURES = [*data.columns]
-CATEGORICAL_FEATURES = [*data.select_dtypes(include=['object', 'category']).columns]
+
+def load_data(path: str) -> pd.DataFrame:
+    """
+    Loads the 401k dataset and derives the income brackets shown in the table.
+
+    :param path: path to the 401k csv file
+    :return: DataFrame hosting the data
+    """
+    data = pd.read_csv(path, index_col=0)
+    data['Income Bracket'] = pd.qcut(data['Income'], 4, labels=['Below Q1', 'Above Q1', 'Above Q2', 'Above Q3'])
+    return data
+
+
+# the dataset is reloaded in the background whenever the csv changes, see WatchedDataSource
+DATA_SOURCE = WatchedDataSource(os.path.join(DATA_ROOT, '401k.csv'), load_data, interval=DATA_POLL_INTERVAL)
+
+DATA = DATA_SOURCE.variable
+FEATURES = [*DATA_SOURCE.data.columns]
+CATEGORICAL_FEATURES = [*DATA_SOURCE.data.select_dtypes(include=['object', 'category']).columns]
 
 GREEN = '#4f9a5c'
 RED = '#c25450'
@@ -20,6 +20,7 @@ from dara.core.visual.components.sidebar_frame import SideBarFrame
 from dara.core.visual.template import TemplateBuilder
 
 from dara_data_interactivity.data_interactivity import DataInteractivityPage
+from dara_data_interactivity.definitions import DATA_SOURCE
 
 # Create a configuration builder
 config = ConfigurationBuilder()
@@ -42,5 +43,8 @@ def template_renderer(config: Configuration):
 config.add_template_renderer('side-bar', template_renderer)
 config.template = 'side-bar'
 
+# Reload the dataset in the background whenever the csv changes
+config.on_startup(DATA_SOURCE.start)
+
 # Register pages
 config.add_page('Data Interactivity', DataInteractivityPage())
@@ -14,8 +14,7 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from collections import defaultdict
-from typing import Union
+from typing import Dict, Tuple, Union
 from bokeh.models import ColumnDataSource
 from bokeh.plotting import figure
 from bokeh.palettes import Blues
@@ -25,6 +24,46 @@ import pandas as pd
 
 from dara_data_interactivity.definitions import CATEGORICAL_FEATURES, GREEN, RED
 
+# histograms of the whole dataset keyed by feature, each entry keeps the DataFrame it was computed from so that
+# a reloaded dataset is picked up instead of serving stale counts
+_POPULATION_HISTOGRAMS: Dict[str, Tuple[pd.DataFrame, Dict[str, np.ndarray]]] = {}
+
+
+def histogram_columns(data: pd.DataFrame, feature: str) -> Dict[str, np.ndarray]:
+    """
+    Computes the columns of the distribution plot of a feature.
+
+    Categorical features get their categories under the feature name and their counts under 'count', continuous
+    features get the counts of ten bins under the feature name and the bin edges under 'left' and 'right'.
+
+    :param data: DataFrame hosting the data in question
+    :param feature: the feature in which the distribution of will be computed
+    :return: dictionary of column names to arrays, ready for a ColumnDataSource
+    """
+    if feature in CATEGORICAL_FEATURES:
+        value_counts = data[feature].value_counts()
+        return {feature: np.asarray(value_counts.index, dtype=str), 'count': value_counts.values}
+
+    hist, edges = np.histogram(data[feature].dropna(), bins=10)
+    return {feature: hist, 'left': edges[:-1], 'right': edges[1:]}
+
+
+def population_histogram(data: pd.DataFrame, feature: str) -> Dict[str, np.ndarray]:
+    """
+    Returns the columns of the distribution plot of a feature over the whole dataset, computing them only once.
+
+    Only the colours depend on the selected individual, so re-rendering on a selection change reuses these columns.
+
+    :param data: DataFrame hosting the whole dataset
+    :param feature: the feature in which the distribution of will be computed
+    :return: dictionary of column names to arrays, shared between calls so it must not be modified
+    """
+    cached = _POPULATION_HISTOGRAMS.get(feature)
+    if cached is None or cached[0] is not data:
+        cached = (data, histogram_columns(data, feature))
+        _POPULATION_HISTOGRAMS[feature] = cached
+    return cached[1]
+
 
 def _categorical_bar_plot(data: pd.DataFrame, feature: str, individual: Union[None, dict] = None):
     """
@@ -35,36 +74,32 @@ def _categorical_bar_plot(data: pd.DataFrame, feature: str, individual: Union[No
     :param individual: optional individual datapoint to be highlighted in the distribution plot
     :return: the Bokeh figure to be plotted by the Bokeh extension
     """
-    value_counts = data[feature].value_counts()
-    hist_data = pd.DataFrame({
-        feature: [*value_counts.index],
-        'count': value_counts.values
-    })
     if individual is not None:
+        hist_data = population_histogram(data, feature)
         # highlighting individual in coral
-        color_dict = defaultdict(lambda: 'steelblue')
-        color_dict[individual[feature]] = 'coral'
-        hist_data['color'] = hist_data[feature].map(color_dict)
+        colors = np.where(hist_data[feature] == str(individual[feature]), 'coral', 'steelblue')
 
         title = f'{feature} Distribution (Whole Dataset)'
     else:
+        hist_data = histogram_columns(data, feature)
         if feature == 'Income Bracket':
             # color coding Income Bracket in blue gradient as in the table
-            hist_data['color'] = hist_data[feature].map({
+            color_map = {
                 'Below Q1': Blues[4][0],
                 'Above Q1': Blues[4][1],
                 'Above Q2': Blues[4][2],
                 'Above Q3': Blues[4][3]
-            })
+            }
         else:
             # color coding Y/N features in green/red as in the table
-            hist_data['color'] = hist_data[feature].map({'Y': GREEN, 'N': RED})
+            color_map = {'Y': GREEN, 'N': RED}
+        colors = [color_map.get(value) for value in hist_data[feature]]
 
         title = f'{feature} Distribution (Selected Individuals)'
 
-    p = figure(title=title, toolbar_location=None, sizing_mode='stretch_both', y_range=hist_data[feature],
+    p = figure(title=title, toolbar_location=None, sizing_mode='stretch_both', y_range=[*hist_data[feature]],
                tools='hover', tooltips='@{%s}: @count' % feature)
-    p.hbar(y=feature, right='count', left=0, source=ColumnDataSource(hist_data),
+    p.hbar(y=feature, right='count', left=0, source=ColumnDataSource({**hist_data, 'color': colors}),
            line_color='white', height=0.8, color='color')
 
     return p
@@ -79,33 +114,27 @@ def _continuous_histogram(data: pd.DataFrame, feature: str, individual: Union[No
     :param individual: optional individual datapoint to be highlighted in the distribution plot
     :return: the Bokeh figure to be plotted by the Bokeh extension
     """
-
-    hist, edges = np.histogram(data[feature].dropna(), bins=10)
-    hist_data = pd.DataFrame({
-        feature: hist,
-        'left': edges[:-1],
-        'right': edges[1:]
-    })
-
     if individual is not None:
-        # highlighting individual in coral
-        colors = []
-        for _, row in hist_data.iterrows():
-            if individual[feature] > row['left'] and individual[feature] < row['right']:
-                colors.append('coral')
-            else:
-                colors.append('steelblue')
-        hist_data['color'] = colors
+        hist_data = population_histogram(data, feature)
+        # highlighting individual in coral, the bin is found the same way np.histogram counted the individual
+        # so the last bin includes its right edge
+        colors = np.full(len(hist_data[feature]), 'steelblue', dtype=object)
+        value = individual[feature]
+        if value is not None and hist_data['left'][0] <= value <= hist_data['right'][-1]:
+            ind = np.searchsorted(hist_data['left'], value, side='right') - 1
+            colors[ind] = 'coral'
 
         title = f'{feature} Distribution (Whole Dataset)'
     else:
-        hist_data['color'] = ['steelblue'] * len(hist)
+        hist_data = histogram_columns(data, feature)
+        colors = ['steelblue'] * len(hist_data[feature])
 
         title = f'{feature} Distribution (Selected Individuals)'
 
     p = figure(title=title, toolbar_location=None, sizing_mode='stretch_both',
                tools='hover', tooltips=[(feature, '@{%s}{0.00}' % feature)])
-    p.quad(bottom=0, top=feature, left='left', right='right', source=ColumnDataSource(hist_data), color='color')
+    p.quad(bottom=0, top=feature, left='left', right='right', source=ColumnDataSource({**hist_data, 'color': colors}),
+           color='color')
 
     p.yaxis.formatter.use_scientific = False
     p.xaxis.formatter.use_scientific = False
@@ -126,3 +155,69 @@ def plot_distribution(data: pd.DataFrame, feature: str, individual: Union[None,
         return _categorical_bar_plot(data, feature, individual)
     else:
         return _continuous_histogram(data, feature, individual)
+
+
+def comparison_columns(data: pd.DataFrame, selection: pd.DataFrame, feature: str) -> Dict[str, np.ndarray]:
+    """
+    Computes the share of the whole dataset and of the selected individuals falling in each bar of a feature.
+
+    The whole dataset counts come from the cached population histogram, so only the selection is binned, using the
+    population's categories or bin edges so that both distributions line up bar for bar.
+
+    :param data: DataFrame hosting the whole dataset
+    :param selection: DataFrame hosting the selected individuals
+    :param feature: the feature in which the distributions of will be computed
+    :return: the population histogram columns along with 'population_share' and 'selection_share'
+    """
+    population = population_histogram(data, feature)
+    if feature in CATEGORICAL_FEATURES:
+        population_counts = population['count']
+        selection_counts = (
+            selection[feature].astype(str).value_counts().reindex(population[feature], fill_value=0).values
+        )
+    else:
+        population_counts = population[feature]
+        edges = np.append(population['left'], population['right'][-1])
+        selection_counts, _ = np.histogram(selection[feature].dropna(), bins=edges)
+
+    return {
+        **population,
+        'population_share': population_counts / max(population_counts.sum(), 1),
+        'selection_share': selection_counts / max(selection_counts.sum(), 1),
+    }
+
+
+def plot_comparison(data: pd.DataFrame, selection: pd.DataFrame, feature: str):
+    """
+    Plots the distribution of the selected individuals over the distribution of the whole dataset.
+
+    Both are shown as shares rather than counts so that a handful of individuals can be compared with the
+    thousands in the whole dataset.
+
+    :param data: DataFrame hosting the whole dataset
+    :param selection: DataFrame hosting the selected individuals
+    :param feature: the feature in which the distributions of will be plotted
+    :return: the Bokeh figure to be plotted by the Bokeh extension
+    """
+    source = ColumnDataSource(comparison_columns(data, selection, feature))
+    title = f'{feature} Distribution (Selected Individuals vs Whole Dataset)'
+    tooltips = [('Whole Dataset', '@population_share{0.0%}'), ('Selected', '@selection_share{0.0%}')]
+
+    if feature in CATEGORICAL_FEATURES:
+        p = figure(title=title, toolbar_location=None, sizing_mode='stretch_both', y_range=[*source.data[feature]],
+                   tools='hover', tooltips=[(feature, '@{%s}' % feature), *tooltips])
+        p.hbar(y=feature, right='population_share', left=0, source=source, line_color='white', height=0.8,
+               color='steelblue', alpha=0.5, legend_label='Whole Dataset')
+        p.hbar(y=feature, right='selection_share', left=0, source=source, line_color='white', height=0.4,
+               color='coral', legend_label='Selected')
+    else:
+        p = figure(title=title, toolbar_location=None, sizing_mode='stretch_both', tools='hover', tooltips=tooltips)
+        p.quad(bottom=0, top='population_share', left='left', right='right', source=source, color='steelblue',
+               alpha=0.5, legend_label='Whole Dataset')
+        p.quad(bottom=0, top='selection_share', left='left', right='right', source=source, color='coral',
+               alpha=0.6, legend_label='Selected')
+        p.xaxis.formatter.use_scientific = False
+
+    p.legend.location = 'top_right'
+
+    return p
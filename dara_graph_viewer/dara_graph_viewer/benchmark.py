@@ -0,0 +1,227 @@
+"""
+Copyright 2023 Impulse Innovations Limited
+
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Headless benchmark of building the graphs of the app, of calculating their centrality and of finding their strongest
+paths.
+
+Run from the root directory of the project with:
+
+    poetry run python -m dara_graph_viewer.benchmark
+
+The graphs are built from synthetic friendships datasets of increasing size, up to a million rows by default, in which
+some friendships appear several times and in both directions, as in the app's dataset.
+
+The centrality measures calculated on the sparse adjacency matrix of the graph are then compared with their networkx
+implementation, on the networkx graphs of the same datasets, and so are the strongest paths found with the index of the
+shortest paths of the graph, both with all the pairs of individuals indexed and with the paths found when queried.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from dara_graph_viewer.centrality import SparseGraph
+from dara_graph_viewer.definitions import ALL_PAIRS_MAX_NODES, build_graph, build_nx_graph, unique_friendships
+from dara_graph_viewer.paths import ShortestPathIndex
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_CENTRALITY_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_PATH_SIZES = [1_000, 10_000, 100_000]
+
+
+def synthetic_friendships(size: int, degree: int = 10, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a friendships dataset with the columns of the app's dataset.
+
+    The individuals are drawn at random, with some individuals much more popular than others, and one in ten
+    friendships is repeated with the individuals swapped.
+
+    :param size: The number of rows of the dataset.
+    :param degree: The average number of rows each individual appears in.
+    :param seed: Seed of the random draws.
+    """
+    rng = np.random.default_rng(seed)
+    n_individuals = max(2 * size // degree, 2)
+    names = np.array([f'Individual {i}' for i in range(n_individuals)], dtype=object)
+
+    popularity = 1 / np.arange(1, n_individuals + 1) ** 0.5
+    popularity /= popularity.sum()
+    first = rng.choice(n_individuals, size, p=popularity)
+    # never befriend oneself
+    second = (first + rng.integers(1, n_individuals, size)) % n_individuals
+
+    repeated = rng.random(size) < 0.1
+    repeated[0] = False
+    source = np.flatnonzero(~repeated)[np.cumsum(~repeated) - 1]
+    first, second = np.where(repeated, second[source], first), np.where(repeated, first[source], second)
+
+    return pd.DataFrame(
+        {
+            'Individual 1': names[first],
+            'Individual 2': names[second],
+            'Interactions': rng.integers(1, 100, size),
+        }
+    )
+
+
+def measure(build: Callable[[], object], repeats: int) -> Dict[str, float]:
+    """
+    Measure the time and memory taken to build a graph.
+
+    The builds are timed with tracing disabled, then the graph is built once more under tracemalloc.
+
+    :param build: The function building the graph.
+    :param repeats: The number of timed builds.
+    """
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        build()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50 (s)': np.percentile(latencies, 50),
+        'max (s)': max(latencies),
+        'peak alloc (MiB)': peak / 2**20,
+    }
+
+
+def run_construction_benchmark(sizes: List[int], repeats: int) -> pd.DataFrame:
+    """
+    Measure building the graphs from friendships datasets of the given sizes.
+
+    :param sizes: The numbers of rows of the datasets.
+    :param repeats: The number of timed builds of each graph.
+    """
+    results = []
+    for size in sizes:
+        friendships = synthetic_friendships(size)
+        edges = len(unique_friendships(friendships))
+        for stage, build in [
+            ('unique_friendships', unique_friendships),
+            ('build_nx_graph', build_nx_graph),
+            ('build_graph', build_graph),
+        ]:
+            results.append(
+                {
+                    'rows': size,
+                    'edges': edges,
+                    'stage': stage,
+                    **measure(lambda: build(friendships), repeats),
+                }
+            )
+
+    return pd.DataFrame(results)
+
+
+def run_centrality_benchmark(sizes: List[int], repeats: int) -> pd.DataFrame:
+    """
+    Measure the centrality measures calculated with networkx and on the sparse adjacency matrix.
+
+    :param sizes: The numbers of rows of the friendships datasets the graphs are built from.
+    :param repeats: The number of timed calculations of each measure.
+    """
+    results = []
+    for size in sizes:
+        graph = build_nx_graph(synthetic_friendships(size))
+        sparse = SparseGraph(graph)
+        for stage, calculate in [
+            ('SparseGraph', lambda: SparseGraph(graph)),
+            ('degree (networkx)', lambda: nx.degree_centrality(graph)),
+            ('degree (sparse)', sparse.degree_centrality),
+            ('eigenvector (networkx)', lambda: nx.eigenvector_centrality(graph)),
+            ('eigenvector (sparse)', sparse.eigenvector_centrality),
+            ('pagerank (networkx)', lambda: nx.pagerank(graph, weight=None)),
+            ('pagerank (sparse)', sparse.pagerank),
+        ]:
+            results.append(
+                {
+                    'rows': size,
+                    'edges': graph.number_of_edges(),
+                    'stage': stage,
+                    **measure(calculate, repeats),
+                }
+            )
+
+    return pd.DataFrame(results)
+
+
+def run_path_benchmark(sizes: List[int], repeats: int, queries: int = 10) -> pd.DataFrame:
+    """
+    Measure finding the strongest paths between random pairs of individuals with networkx and with the index.
+
+    The index is measured with every pair of individuals indexed, on networks of up to ALL_PAIRS_MAX_NODES
+    individuals, and with the paths found when queried, without reusing the paths of earlier queries.
+
+    :param sizes: The numbers of rows of the friendships datasets the graphs are built from.
+    :param repeats: The number of timed runs of each stage.
+    :param queries: The number of pairs of individuals whose path is found in each run.
+    """
+    results = []
+    for size in sizes:
+        graph = build_nx_graph(synthetic_friendships(size))
+        pairs = [random.Random(i).sample(list(graph), 2) for i in range(queries)]
+        on_query = ShortestPathIndex(graph, max_all_pairs_nodes=0, cached_sources=0)
+        stages = [
+            (f'dijkstra_path ({queries} queries)', lambda: [nx.dijkstra_path(graph, *pair) for pair in pairs]),
+            (f'path, on query ({queries} queries)', lambda: [on_query.path(*pair) for pair in pairs]),
+        ]
+        if len(graph) <= ALL_PAIRS_MAX_NODES:
+            all_pairs = ShortestPathIndex(graph, max_all_pairs_nodes=len(graph))
+            stages += [
+                ('ShortestPathIndex (all pairs)', lambda: ShortestPathIndex(graph, max_all_pairs_nodes=len(graph))),
+                (f'path, all pairs ({queries} queries)', lambda: [all_pairs.path(*pair) for pair in pairs]),
+            ]
+        for stage, run in stages:
+            results.append(
+                {
+                    'rows': size,
+                    'edges': graph.number_of_edges(),
+                    'stage': stage,
+                    **measure(run, repeats),
+                }
+            )
+
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark building the graphs of the app, their centrality and strongest paths.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='rows of the friendships datasets')
+    parser.add_argument('--centrality-sizes', type=int, nargs='+', default=DEFAULT_CENTRALITY_SIZES,
+                        help='rows of the friendships datasets the centrality measures are calculated on')
+    parser.add_argument('--path-sizes', type=int, nargs='+', default=DEFAULT_PATH_SIZES,
+                        help='rows of the friendships datasets the strongest paths are found on')
+    parser.add_argument('--repeats', type=int, default=3, help='number of timed builds of each graph')
+    args = parser.parse_args()
+
+    report = pd.concat([
+        run_construction_benchmark(args.sizes, args.repeats),
+        run_centrality_benchmark(args.centrality_sizes, args.repeats),
+        run_path_benchmark(args.path_sizes, args.repeats),
+    ], ignore_index=True)
+    with pd.option_context('display.width', None, 'display.float_format', '{:.3f}'.format):
+        print(report.to_string(index=False))
@@ -0,0 +1,231 @@
+"""
+Copyright 2023 Impulse Innovations Limited
+
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Centrality measures for graphs too large for their networkx implementation.
+
+This module does not import the app's definitions, so that the worker processes it starts do
+not load the datasets and build the graphs again.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import scipy.sparse.linalg
+
+# the graph of the worker processes, sent to each of them once when it starts
+_WORKER_GRAPH: Optional[nx.Graph] = None
+
+# the sparse adjacency of each graph, keyed by the id of the graph and the weight of the edges
+_SPARSE_GRAPHS: Dict[Tuple[int, Optional[str]], Tuple[nx.Graph, 'SparseGraph']] = {}
+_SPARSE_GRAPHS_LOCK = threading.Lock()
+
+
+class ApproximateScores(dict):
+    """
+    Centrality scores of each node estimated from a sample of the nodes, along with the standard
+    error of each score.
+    """
+
+    def __init__(self, scores: Dict[str, float], standard_errors: Dict[str, float], pivots: int):
+        """
+        :param scores: The estimated score of each node.
+        :param standard_errors: The standard error of the score of each node.
+        :param pivots: The number of nodes sampled.
+        """
+        super().__init__(scores)
+        self.standard_errors = standard_errors
+        self.pivots = pivots
+
+    def report(self) -> str:
+        """Describe how precise the scores are."""
+        if self.pivots >= len(self):
+            return f'Calculated from all {len(self)} individuals.'
+        if not self.standard_errors:
+            return f'Estimated from {self.pivots} of {len(self)} individuals.'
+        errors = np.fromiter(self.standard_errors.values(), dtype=float)
+        return (
+            f'Estimated from {self.pivots} of {len(self)} individuals, with a standard error of '
+            f'{errors.mean():.2g} on average and {errors.max():.2g} at most.'
+        )
+
+
+class SparseGraph:
+    """
+    A graph as a SciPy CSR adjacency matrix, so that its centrality measures are calculated with
+    sparse linear algebra rather than by walking the networkx adjacency in Python.
+
+    The edges are unweighted by default, as in the networkx centrality measures of the app.
+    """
+
+    def __init__(self, graph: nx.Graph, weight: Optional[str] = None):
+        """
+        :param graph: The graph, undirected.
+        :param weight: The edge attribute holding the weight of the edges, 1 for every edge if None.
+        """
+        self.nodes = list(graph)
+        n = len(self.nodes)
+        if weight is None:
+            edges = pd.DataFrame(list(graph.edges()), columns=['u', 'v'], dtype=object)
+            weights = np.ones(len(edges))
+        else:
+            edges = pd.DataFrame(
+                list(graph.edges(data=weight, default=1)), columns=['u', 'v', 'weight']
+            )
+            weights = edges['weight'].to_numpy(dtype=float)
+        u = pd.Categorical(edges['u'], categories=self.nodes).codes
+        v = pd.Categorical(edges['v'], categories=self.nodes).codes
+        # every edge goes both ways, but self-loops only once
+        loops = u == v
+        rows = np.concatenate([u, v[~loops]])
+        columns = np.concatenate([v, u[~loops]])
+        self.adjacency = scipy.sparse.csr_array(
+            (np.concatenate([weights, weights[~loops]]), (rows, columns)), shape=(n, n)
+        )
+        # the number of neighbors of each node, or the total weight of its edges if weighted
+        self.degrees = np.asarray(self.adjacency.sum(axis=1)).ravel()
+
+    @classmethod
+    def of(cls, graph: nx.Graph, weight: Optional[str] = None) -> 'SparseGraph':
+        """
+        Get the sparse adjacency of a graph, only built once for each graph object and weight.
+
+        :param graph: The graph, which must not change once its adjacency is built.
+        :param weight: The edge attribute holding the weight of the edges, 1 for every edge if None.
+        """
+        with _SPARSE_GRAPHS_LOCK:
+            if (id(graph), weight) not in _SPARSE_GRAPHS:
+                _SPARSE_GRAPHS[(id(graph), weight)] = (graph, cls(graph, weight))
+            return _SPARSE_GRAPHS[(id(graph), weight)][1]
+
+    def _scores(self, values: np.ndarray) -> Dict[str, float]:
+        return dict(zip(self.nodes, values.tolist()))
+
+    def degree_centrality(self) -> Dict[str, float]:
+        """The number of neighbors of each node, normalized by the number of other nodes."""
+        if len(self.nodes) <= 1:
+            return self._scores(np.ones(len(self.nodes)))
+        return self._scores(self.degrees / (len(self.nodes) - 1))
+
+    def eigenvector_centrality(self) -> Dict[str, float]:
+        """
+        The principal eigenvector of the adjacency matrix, found with ARPACK and normalized to a
+        unit Euclidean norm.
+        """
+        if len(self.nodes) < 3:
+            # ARPACK needs more nodes than eigenvectors, a dense solver is fine on small graphs
+            _, vectors = np.linalg.eigh(self.adjacency.toarray())
+            vector = vectors[:, -1]
+        else:
+            _, vectors = scipy.sparse.linalg.eigsh(self.adjacency, k=1, which='LA')
+            vector = vectors[:, 0]
+        # the eigenvector is only defined up to its sign
+        vector = vector * np.sign(vector.sum())
+        return self._scores(vector / np.linalg.norm(vector))
+
+    def pagerank(self, alpha: float = 0.85, tol: float = 1e-06, max_iter: int = 100) -> Dict[str, float]:
+        """
+        The PageRank of each node, calculated by power iteration with sparse matrix products.
+        Nodes without neighbors share their rank between every node.
+
+        :param alpha: The damping factor, the probability of following an edge rather than jumping to a random node.
+        :param tol: The tolerance of the convergence, per node.
+        :param max_iter: The maximum number of iterations.
+        """
+        n = len(self.nodes)
+        if n == 0:
+            return {}
+        dangling = self.degrees == 0
+        inverse_degrees = np.divide(1, self.degrees, out=np.zeros(n), where=~dangling)
+        ranks = np.full(n, 1 / n)
+        for _ in range(max_iter):
+            previous = ranks
+            ranks = alpha * (self.adjacency @ (previous * inverse_degrees))
+            ranks += (alpha * previous[dangling].sum() + 1 - alpha) / n
+            if np.abs(ranks - previous).sum() < n * tol:
+                return self._scores(ranks)
+        raise nx.PowerIterationFailedConvergence(max_iter)
+
+
+def _sampled_betweenness(graph: nx.Graph, pivots: int, seed: int) -> Dict[str, float]:
+    """Estimate the betweenness centrality from the shortest paths of a sample of the nodes."""
+    return nx.betweenness_centrality(graph, k=pivots, seed=seed)
+
+
+def _init_worker(graph: nx.Graph):
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = graph
+
+
+def _worker_betweenness(pivots: int, seed: int) -> Dict[str, float]:
+    return _sampled_betweenness(_WORKER_GRAPH, pivots, seed)
+
+
+def approximate_betweenness(
+    graph: nx.Graph,
+    pivots: int,
+    batches: int = 16,
+    workers: int = 1,
+    seed: int = 0,
+) -> ApproximateScores:
+    """
+    Estimate the betweenness centrality of each node by pivot sampling.
+
+    Rather than following the shortest paths from every node, which is infeasible on large
+    graphs, the shortest paths from a random sample of pivot nodes are followed and the scores
+    are scaled up accordingly. The pivots are split in batches drawn independently, each giving
+    its own estimate of the scores: the scores are the mean of the estimates and their standard
+    error is derived from the spread of the estimates.
+
+    :param graph: The graph to calculate the betweenness centrality of.
+    :param pivots: The number of nodes to sample, the scores are exact if it is at least the
+        number of nodes of the graph.
+    :param batches: The number of batches the pivots are split in.
+    :param workers: The number of processes the batches are shared between, the batches are
+        calculated in the current process if 1.
+    :param seed: Seed of the sampling, batch i is sampled with seed + i.
+    """
+    if pivots >= len(graph):
+        return ApproximateScores(nx.betweenness_centrality(graph), {}, len(graph))
+    if pivots < 2 * batches:
+        return ApproximateScores(_sampled_betweenness(graph, pivots, seed), {}, pivots)
+
+    sizes = [len(batch) for batch in np.array_split(np.arange(pivots), batches)]
+    seeds = [seed + i for i in range(batches)]
+    if workers > 1:
+        # spawn rather than fork the workers, as the app runs in several threads
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(graph,),
+        ) as executor:
+            estimates: List[Dict[str, float]] = list(
+                executor.map(_worker_betweenness, sizes, seeds)
+            )
+    else:
+        estimates = [_sampled_betweenness(graph, size, s) for size, s in zip(sizes, seeds)]
+
+    nodes = list(graph)
+    # the batches have the same number of pivots, give or take one, so they are equally weighted
+    values = np.array([[estimate[node] for node in nodes] for estimate in estimates])
+    means = values.mean(axis=0)
+    errors = values.std(axis=0, ddof=1) / np.sqrt(batches)
+    return ApproximateScores(dict(zip(nodes, means)), dict(zip(nodes, errors)), pivots)
@@ -14,6 +14,8 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import os
+
 import networkx as nx
 import pandas as pd
 from cai_causal_graph import CausalGraph
@@ -23,6 +25,23 @@ FRIENDSHIPS_DATA = pd.read_csv('data/friendships.csv', index_col=0)
 INTERACTIONS_DATA = pd.read_csv('data/interactions.csv', index_col=0)
 
 
+def unique_friendships(friendships: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keep the first row of each friendship in the dataset.
+    A friendship is the same whichever individual comes first, so the pairs are
+    put in a canonical order before dropping the duplicates, in a single pass.
+    The rows kept are returned as they are, in their original order.
+
+    :param friendships: The friendships dataset.
+    """
+    first, second = friendships['Individual 1'], friendships['Individual 2']
+    in_order = first <= second
+    pairs = pd.DataFrame(
+        {'low': first.where(in_order, second), 'high': second.where(in_order, first)}
+    )
+    return friendships[~pairs.duplicated(keep='first').to_numpy()]
+
+
 def build_graph(friendships: pd.DataFrame):
     """
     Build a CausalGraph from the friendships in the dataset.
@@ -31,30 +50,38 @@ def build_graph(friendships: pd.DataFrame):
     aesthetic properties like background color and text color. 
     """
     graph = CausalGraph()
+    friendships = unique_friendships(friendships)
 
-    for _, row in friendships.iterrows():
-        if graph.edge_exists(
-            row['Individual 1'], row['Individual 2']
-        ) or graph.edge_exists(row['Individual 2'], row['Individual 1']):
-            continue
-        graph.add_edge(
-            row['Individual 1'],
-            row['Individual 2'],
-            edge_type='<>',
+    # add the individuals in the order they first appear in the dataset
+    individuals = pd.unique(
+        friendships[['Individual 1', 'Individual 2']].to_numpy().ravel()
+    )
+    for individual in individuals:
+        graph.add_node(
+            individual,
             meta={
                 'rendering_properties': {
-                    'tooltip': f"{row['Interactions']} interactions"
+                    'color': Light.colors.blue4,
+                    'highlight_color': Light.colors.primary,
+                    'label_color': Light.colors.text,
                 }
             },
         )
-    for node in graph.get_nodes():
-        node.meta = {
-            'rendering_properties': {
-                'color': Light.colors.blue4,
-                'highlight_color': Light.colors.primary,
-                'label_color': Light.colors.text,
-            }
-        }
+
+    # the pairs are unique and bidirected edges cannot form a directed cycle,
+    # so the edges are added without validating the graph each time
+    for source, destination, interactions in zip(
+        friendships['Individual 1'],
+        friendships['Individual 2'],
+        friendships['Interactions'],
+    ):
+        graph.add_edge(
+            source,
+            destination,
+            edge_type='<>',
+            meta={'rendering_properties': {'tooltip': f'{interactions} interactions'}},
+            validate=False,
+        )
 
     return graph
 
@@ -62,29 +89,33 @@ def build_graph(friendships: pd.DataFrame):
 def build_nx_graph(friendships: pd.DataFrame):
     """Build a Networkx graph from the friendships in the dataset."""
     nx_graph = nx.Graph()
+    friendships = unique_friendships(friendships)
 
-    for _, row in friendships.iterrows():
-        if nx_graph.get_edge_data(
-            row['Individual 1'], row['Individual 2']
-        ) or nx_graph.get_edge_data(row['Individual 2'], row['Individual 1']):
-            continue
-        # Dijkstra's algorithm finds the shortest path with the smallest weights.
-        # As you will want to find the shortest path with the strongest connections,
-        # the weights should be the inverse of the interactions so that smaller weights
-        # equate to more interactions.
-        nx_graph.add_edge(
-            row['Individual 1'],
-            row['Individual 2'],
-            weight=1 / row['Interactions'],
-        )
-        nx_graph.add_edge(
-            row['Individual 2'],
-            row['Individual 1'],
-            weight=1 / row['Interactions'],
+    # Dijkstra's algorithm finds the shortest path with the smallest weights.
+    # As you will want to find the shortest path with the strongest connections,
+    # the weights should be the inverse of the interactions so that smaller weights
+    # equate to more interactions.
+    nx_graph.add_weighted_edges_from(
+        zip(
+            friendships['Individual 1'],
+            friendships['Individual 2'],
+            1 / friendships['Interactions'],
         )
+    )
 
     return nx_graph
 
 
 GRAPH = build_graph(FRIENDSHIPS_DATA)
 NX_GRAPH = build_nx_graph(FRIENDSHIPS_DATA)
+
+# the number of individuals sampled to estimate the betweenness centrality, and the number of
+# processes sharing the estimation
+BETWEENNESS_PIVOTS = int(os.environ.get('BETWEENNESS_PIVOTS', '256'))
+BETWEENNESS_WORKERS = int(os.environ.get('BETWEENNESS_WORKERS', '1'))
+# the exact betweenness centrality is only offered for networks up to this number of individuals
+EXACT_BETWEENNESS_MAX_NODES = int(os.environ.get('EXACT_BETWEENNESS_MAX_NODES', '5000'))
+
+# the strongest paths between every pair of individuals are indexed on networks up to this number
+# of individuals, on larger networks they are found when the individuals are selected
+ALL_PAIRS_MAX_NODES = int(os.environ.get('ALL_PAIRS_MAX_NODES', '2000'))
@@ -24,6 +24,9 @@ from dara_graph_viewer.pages import (
     IntroductionPage,
     StrongestPathsPage,
 )
+from dara_graph_viewer.pages.influential_individuals import precompute_centrality
+from dara_graph_viewer.pages.strongest_paths import precompute_path_index
+from dara_graph_viewer.utils import StyledGraph
 
 # Create a configuration builder
 config = ConfigurationBuilder()
@@ -46,7 +49,15 @@ def template_renderer(config: Configuration):
 config.add_template_renderer('side-bar', template_renderer)
 config.template = 'side-bar'
 
+# Styled graphs are sent to the CausalGraphViewer with their styles applied
+config.add_encoder(StyledGraph, serialize=StyledGraph.to_dict, deserialize=StyledGraph.from_dict)
+
 # Register pages
 config.add_page('Social Networks', IntroductionPage())
 config.add_page('Influential Individuals', InfluentialIndividualsPage())
 config.add_page('Strongest Path', StrongestPathsPage())
+
+# Calculate the centrality of the individuals and index the strongest paths between them in the
+# background as soon as the app starts
+config.on_startup(precompute_centrality)
+config.on_startup(precompute_path_index)
@@ -14,20 +14,27 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-import bisect
-from typing import Dict
+from functools import partial
+from typing import Callable, Dict
 
 import networkx as nx
 import numpy as np
 import plotly.express as px
-from cai_causal_graph import CausalGraph
 from dara.components import Card, CausalGraphViewer, Modal, Select, Stack, Text
 from dara.components.graphs import EditorMode
 from dara.components.plotting import Plotly
 from dara.core import ComponentInstance, DerivedVariable, Variable, py_component
 from dara.core.visual.themes import Light
 
-from dara_graph_viewer.definitions import GRAPH, NX_GRAPH
+from dara_graph_viewer.centrality import ApproximateScores, SparseGraph, approximate_betweenness
+from dara_graph_viewer.definitions import (
+    BETWEENNESS_PIVOTS,
+    BETWEENNESS_WORKERS,
+    EXACT_BETWEENNESS_MAX_NODES,
+    GRAPH,
+    NX_GRAPH,
+)
+from dara_graph_viewer.utils import GraphComputationCache, StyledGraph
 
 COLOR_PALETTE = px.colors.sequential.Redor
 
@@ -35,25 +42,55 @@ COLOR_PALETTE = px.colors.sequential.Redor
 CENTRALITY_DEFINITIONS = {
     'Degree Centrality': 'The degree centrality of a node is the number of edges associated with it. The higher the degree, the more central the node is. The degree centrality is then normalized.',
     'Betweenness Centrality': 'The betweenness centrality of a node is based on the shortest paths. For every pair of nodes in a connected graph, there exists at least one shortest path between them. The betweenness centrality for each node is the number of these shortest paths that pass through the node.',
+    'Approximate Betweenness Centrality': 'The approximate betweenness centrality estimates the betweenness centrality of each node from the shortest paths starting at a random sample of the nodes only, which is much faster on large networks.',
     'Eigenvector Centrality': 'A high eigenvector score means that a node is connected to many nodes who themselves have high scores.',
+    'PageRank': 'The PageRank of a node is the probability of reaching it when walking the network at random, following an edge most of the time and jumping to any node otherwise. Like the eigenvector centrality, a node connected to nodes with high scores gets a high score, but the score a node passes on is shared between its neighbors.',
 }
 
+# degree, eigenvector and PageRank are calculated on the sparse adjacency matrix of the graph
+CENTRALITY_MEASURES: Dict[str, Callable[[nx.Graph], Dict]] = {
+    'Degree Centrality': lambda graph: SparseGraph.of(graph).degree_centrality(),
+    'Betweenness Centrality': nx.betweenness_centrality,
+    'Approximate Betweenness Centrality': partial(
+        approximate_betweenness,
+        pivots=BETWEENNESS_PIVOTS,
+        workers=BETWEENNESS_WORKERS,
+    ),
+    'Eigenvector Centrality': lambda graph: SparseGraph.of(graph).eigenvector_centrality(),
+    'PageRank': lambda graph: SparseGraph.of(graph).pagerank(),
+}
+# the exact betweenness centrality would take hours on large networks
+if len(NX_GRAPH) > EXACT_BETWEENNESS_MAX_NODES:
+    del CENTRALITY_MEASURES['Betweenness Centrality']
+
+# the centrality scores of the graph, shared by every user of the app
+CENTRALITY_SCORES = GraphComputationCache()
+
+
+def precompute_centrality() -> Callable[[], None]:
+    """
+    Start calculating every centrality measure of the graph in the background.
+    Run when the app starts, so that the scores are ready when a measure is selected.
+
+    :return: A function cancelling the calculations still waiting when the app stops.
+    """
+    for measure, calculate in CENTRALITY_MEASURES.items():
+        CENTRALITY_SCORES.submit(NX_GRAPH, measure, calculate)
+    return CENTRALITY_SCORES.shutdown
+
 
 def calculate_centrality(measure: str) -> Dict:
     """
     Calculate the given centrality measure for each node.
+    The scores are only calculated once for the graph, they are otherwise read from the cache,
+    waiting for their calculation if it is still running.
 
     :param measure: The selected centrality measure.
     """
-    if measure == 'Degree Centrality':
-        return nx.degree_centrality(NX_GRAPH)
-    elif measure == 'Betweenness Centrality':
-        return nx.betweenness_centrality(NX_GRAPH)
-    else:
-        return nx.eigenvector_centrality(NX_GRAPH)
+    return CENTRALITY_SCORES.get(NX_GRAPH, measure, CENTRALITY_MEASURES[measure])
 
 
-def color_graph(scores: Dict[str, float]) -> CausalGraph:
+def color_graph(scores: Dict[str, float]) -> StyledGraph:
     """
     Color the graph according to the calculated scores for each node.
     The color is chosen based on a linear scale of the color palette provided.
@@ -61,20 +98,19 @@ def color_graph(scores: Dict[str, float]) -> CausalGraph:
 
     :param scores: The centrality score for each node.
     """
-    graph = GRAPH.copy()
-
-    score_linspace = np.linspace(
-        min([*scores.values()]), max([*scores.values()]), len(COLOR_PALETTE)
+    graph = StyledGraph(GRAPH)
+    if not scores:
+        return graph
+
+    values = np.fromiter(scores.values(), dtype=float, count=len(scores))
+    score_linspace = np.linspace(values.min(), values.max(), len(COLOR_PALETTE))
+    # the index of the first step of the scale at or above each score
+    indices = np.searchsorted(score_linspace, values, side='left')
+    graph.style_nodes(
+        list(scores),
+        color=np.asarray(COLOR_PALETTE)[indices],
+        label_color=Light.colors.grey1,
     )
-    for name, value in scores.items():
-        ind = bisect.bisect_left(score_linspace, value)
-        node = graph.get_node(name)
-        node.meta = {
-            'rendering_properties': {
-                'color': COLOR_PALETTE[ind],
-                'label_color': Light.colors.grey1,
-            }
-        }
 
     return graph
 
@@ -96,6 +132,14 @@ def CentralityScoresGraph(measure: str, scores: Dict[str, float]) -> ComponentIn
         color='Value',
         color_continuous_scale=COLOR_PALETTE,
     )
+    # the scores received are plain values, the report of the estimate is read from the cache
+    calculated = calculate_centrality(measure)
+    if isinstance(calculated, ApproximateScores):
+        return Stack(
+            Text(CENTRALITY_DEFINITIONS[measure]),
+            Text(calculated.report(), italic=True),
+            Plotly(fig),
+        )
     return Stack(Text(CENTRALITY_DEFINITIONS[measure]), Plotly(fig))
 
 
@@ -125,11 +169,7 @@ def InfluentialIndividualsPage() -> ComponentInstance:
             Stack(
                 Text('Centrality Measure', width='30%'),
                 Select(
-                    items=[
-                        'Degree Centrality',
-                        'Betweenness Centrality',
-                        'Eigenvector Centrality',
-                    ],
+                    items=[*CENTRALITY_MEASURES],
                     value=selected_measure,
                 ),
                 direction='horizontal',
@@ -14,11 +14,10 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from typing import List
+from typing import Callable, List
 
 import networkx as nx
 import pandas as pd
-from cai_causal_graph import CausalGraph
 from dara.core import ComponentInstance
 from dara.components import Button, Card, CausalGraphViewer, Stack, Table, Text
 from dara.components.graphs import EditorMode
@@ -33,37 +32,33 @@ from dara.core import (
 from dara.core.interactivity import ActionContext
 from dara.core.visual.themes import Light
 
-from dara_graph_viewer.definitions import GRAPH, NX_GRAPH
-from dara_graph_viewer.utils import filter_friendships_data
+from dara_graph_viewer.definitions import ALL_PAIRS_MAX_NODES, GRAPH, NX_GRAPH
+from dara_graph_viewer.paths import ShortestPathIndex
+from dara_graph_viewer.utils import GraphComputationCache, StyledGraph, filter_friendships_data
 
+# the index of the strongest paths of the graph, shared by every user of the app
+PATH_INDEX = GraphComputationCache()
 
-def color_graph(nodes: List[str], path: List[str]) -> CausalGraph:
+
+def color_graph(nodes: List[str], path: List[str]) -> StyledGraph:
     """
     Color the graph according to the selected nodes and the resulting shortest path.
     Selected nodes are colored violet while nodes and edges along the path are colored orange.
 
     :param nodes: The list of selected nodes.
     :param path: The list of nodes along the shortest path, including the selected nodes.
-    :return: A CausalGraph instance with the updated meta information.
+    :return: A StyledGraph of the graph with the updated colors.
     """
-    graph_copy = GRAPH.copy()
+    graph = StyledGraph(GRAPH)
     for node in nodes:
-        temp_node = graph_copy.get_node(node)
-        temp_node.meta['rendering_properties']['color'] = Light.colors.violet
-        temp_node.meta['rendering_properties']['label_color'] = Light.colors.grey1
+        graph.style_node(node, color=Light.colors.violet, label_color=Light.colors.grey1)
     for i in range(0, len(path)):
         if path[i] not in nodes:
-            temp_node = graph_copy.get_node(path[i])
-            temp_node.meta['rendering_properties']['color'] = Light.colors.orange
+            graph.style_node(path[i], color=Light.colors.orange)
 
         if i != len(path) - 1:
-            if graph_copy.edge_exists(path[i], path[i + 1]):
-                temp_edge = graph_copy.get_edge(path[i], path[i + 1])
-                temp_edge.meta['rendering_properties']['color'] = Light.colors.orange
-            elif graph_copy.edge_exists(path[i + 1], path[i]):
-                temp_edge = graph_copy.get_edge(path[i + 1], path[i])
-                temp_edge.meta['rendering_properties']['color'] = Light.colors.orange
-    return graph_copy
+            graph.style_edge(path[i], path[i + 1], color=Light.colors.orange)
+    return graph
 
 
 def select_two_nodes(ctx: ActionContext) -> List[str]:
@@ -79,14 +74,39 @@ def select_two_nodes(ctx: ActionContext) -> List[str]:
     return current_nodes[-2:]
 
 
+def build_path_index(graph: nx.Graph) -> ShortestPathIndex:
+    """
+    Index the shortest paths of the graph.
+
+    :param graph: The graph to index, weighted by the inverse of the interactions.
+    """
+    return ShortestPathIndex(graph, max_all_pairs_nodes=ALL_PAIRS_MAX_NODES)
+
+
+def precompute_path_index() -> Callable[[], None]:
+    """
+    Start indexing the shortest paths of the graph in the background.
+    Run when the app starts, so that paths are looked up rather than searched for.
+
+    :return: A function cancelling the indexing if it has not started when the app stops.
+    """
+    PATH_INDEX.submit(NX_GRAPH, 'shortest paths', build_path_index)
+    return PATH_INDEX.shutdown
+
+
 def calculate_shortest_path(nodes: List[str]) -> List[str]:
     """
     Calculate the shortest path using Dijkstra's algorithm.
+    The path is read from the index of the shortest paths of the graph, or found with networkx
+    while the index is still being built.
 
     :param nodes: The list of two nodes in which to find the shortest path to and from.
     :return: A list of nodes that represents the shortest path.
     """
     if len(nodes) == 2:
+        index = PATH_INDEX.submit(NX_GRAPH, 'shortest paths', build_path_index)
+        if index.done():
+            return index.result().path(nodes[0], nodes[1])
         return nx.dijkstra_path(NX_GRAPH, nodes[0], nodes[1])
     return []
 
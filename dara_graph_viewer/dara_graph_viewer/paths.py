@@ -0,0 +1,148 @@
+"""
+Copyright 2023 Impulse Innovations Limited
+
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Index of the shortest paths of a weighted graph, answering queries without running Dijkstra's
+algorithm from scratch.
+"""
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csgraph
+
+from dara_graph_viewer.centrality import SparseGraph
+
+
+class ShortestPathIndex:
+    """
+    Index of the shortest paths between the nodes of a weighted undirected graph.
+
+    On graphs of up to `max_all_pairs_nodes` nodes, Dijkstra's algorithm is run once from every
+    node and only the predecessor of each node on the shortest path from each source is kept, in
+    the smallest integer type that fits, e.g. 8 MB for 2000 nodes. A path is then read by walking
+    the predecessors back from the target.
+
+    On larger graphs, where the predecessors of every source would not fit in memory, Dijkstra's
+    algorithm is run on the sparse adjacency matrix of the graph from one end of the path, in
+    compiled code, and the predecessors from the ends of the most recent queries are kept. As the
+    graph is undirected, the predecessors from either end of a path give the whole path.
+    """
+
+    # the number of sources Dijkstra's algorithm is run from at once when indexing every pair
+    _CHUNK_SIZE = 256
+
+    def __init__(
+        self,
+        graph: nx.Graph,
+        weight: str = 'weight',
+        max_all_pairs_nodes: int = 2000,
+        cached_sources: int = 32,
+    ):
+        """
+        :param graph: The graph, which must not change once indexed.
+        :param weight: The edge attribute holding the weight of the edges, which must be positive.
+        :param max_all_pairs_nodes: The largest number of nodes for which all the paths are indexed.
+        :param cached_sources: The number of sources whose predecessors are kept on larger graphs.
+        """
+        self._sparse = SparseGraph.of(graph, weight)
+        self.nodes = self._sparse.nodes
+        self._index = {node: i for i, node in enumerate(self.nodes)}
+        self._dtype = np.int16 if len(self.nodes) < np.iinfo(np.int16).max else np.int32
+
+        self._all_predecessors = None
+        if len(self.nodes) <= max_all_pairs_nodes:
+            self._all_predecessors = np.empty((len(self.nodes), len(self.nodes)), dtype=self._dtype)
+            # the sources are taken in chunks, so that the distances are never all held at once
+            for chunk in range(0, len(self.nodes), self._CHUNK_SIZE):
+                sources = np.arange(chunk, min(chunk + self._CHUNK_SIZE, len(self.nodes)))
+                self._all_predecessors[sources] = self._dijkstra(sources)
+
+        # the predecessors from the most recent sources, the least recently used first
+        self._cached_sources = cached_sources
+        self._cache: 'OrderedDict[int, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _dijkstra(self, sources) -> np.ndarray:
+        """
+        Run Dijkstra's algorithm from one or more sources.
+
+        :return: The predecessor of each node on its shortest path from each source, -1 for the
+            sources themselves and for the nodes they do not reach.
+        """
+        _, predecessors = csgraph.dijkstra(
+            self._sparse.adjacency, directed=False, indices=sources, return_predecessors=True
+        )
+        return np.maximum(predecessors, -1).astype(self._dtype)
+
+    def _predecessors(self, source: int, compute: bool = True) -> Optional[np.ndarray]:
+        """
+        Get the predecessor of each node on its shortest path from a source.
+
+        :param source: The index of the source.
+        :param compute: Whether to run Dijkstra's algorithm if the predecessors are neither
+            indexed nor cached, None is returned otherwise.
+        """
+        if self._all_predecessors is not None:
+            return self._all_predecessors[source]
+        with self._lock:
+            if source in self._cache:
+                self._cache.move_to_end(source)
+                return self._cache[source]
+        if not compute:
+            return None
+
+        predecessors = self._dijkstra(source)
+        with self._lock:
+            self._cache[source] = predecessors
+            while len(self._cache) > self._cached_sources:
+                self._cache.popitem(last=False)
+        return predecessors
+
+    def path(self, source: str, target: str) -> List[str]:
+        """
+        Find the shortest path between two nodes.
+
+        :param source: The node the path starts at.
+        :param target: The node the path ends at.
+        :return: The list of nodes along the path, including the source and target.
+        """
+        for node in (source, target):
+            if node not in self._index:
+                raise nx.NodeNotFound(f'Node {node} not in graph')
+        start, end = self._index[source], self._index[target]
+
+        # walk the predecessors from the start back from the end, unless only those from the end
+        # are at hand, which are walked back from the start
+        walk_from, walk_to = end, start
+        predecessors = self._predecessors(start, compute=False)
+        if predecessors is None:
+            predecessors = self._predecessors(end, compute=False)
+            if predecessors is not None:
+                walk_from, walk_to = start, end
+            else:
+                predecessors = self._predecessors(start)
+
+        path = [walk_from]
+        while path[-1] != walk_to:
+            predecessor = int(predecessors[path[-1]])
+            if predecessor < 0:
+                raise nx.NetworkXNoPath(f'No path between {source} and {target}.')
+            path.append(predecessor)
+        if walk_from == end:
+            path.reverse()
+        return [self.nodes[i] for i in path]
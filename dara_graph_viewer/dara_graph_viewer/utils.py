@@ -14,11 +14,19 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-from typing import Optional, Tuple
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+import networkx as nx
+import numpy as np
 import pandas as pd
+from cai_causal_graph import CausalGraph
 
 from dara_graph_viewer.definitions import FRIENDSHIPS_DATA, INTERACTIONS_DATA
 
+# the dictionary representation of each graph styled, keyed by the id of the graph
+_GRAPH_DICTS: Dict[int, Tuple[CausalGraph, dict]] = {}
+
 
 def filter_interactions_data(edge: Optional[Tuple[str, str]]) -> pd.DataFrame:
     """Filter the interactions dataset for the given edge."""
@@ -50,3 +58,215 @@ def filter_friendships_data(edge: Optional[Tuple[str, str]]) -> pd.DataFrame:
         & (FRIENDSHIPS_DATA['Individual 2'] == edge[0])
     ]
     return pd.concat([filter1, filter2])
+
+
+def graph_fingerprint(graph: nx.Graph) -> str:
+    """
+    Fingerprint a networkx graph by its nodes and its weighted edges.
+    The fingerprint does not depend on the order the nodes and edges were added in, nor on the
+    direction the edges were added in, so it only changes when the graph itself does.
+
+    :param graph: The graph to fingerprint.
+    :return: A hexadecimal digest of the graph.
+    """
+    nodes = pd.Series(list(graph.nodes), dtype=object)
+    edges = pd.DataFrame(
+        list(graph.edges(data='weight')), columns=['source', 'target', 'weight']
+    )
+    in_order = edges['source'] <= edges['target']
+    pairs = pd.DataFrame(
+        {
+            'low': edges['source'].where(in_order, edges['target']),
+            'high': edges['target'].where(in_order, edges['source']),
+            'weight': edges['weight'],
+        }
+    )
+    # the hashes of the rows are summed, so that their order does not matter
+    nodes_hash = pd.util.hash_pandas_object(nodes, index=False).to_numpy().sum(dtype=np.uint64)
+    edges_hash = pd.util.hash_pandas_object(pairs, index=False).to_numpy().sum(dtype=np.uint64)
+    return f'{len(nodes):x}-{nodes_hash:016x}-{edges_hash:016x}'
+
+
+class GraphComputationCache:
+    """
+    Results of computations on networkx graphs, each computed once per version of a graph.
+
+    The computations run in a pool of background threads, so they can be started when the app
+    starts and be ready by the time they are needed. The results are keyed by the fingerprint of
+    the graph and the name of the computation, so a graph rebuilt from the same data reuses them,
+    while a graph that changed gets new ones.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        :param max_workers: The number of computations run at the same time.
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='graph-computation'
+        )
+        self._lock = threading.Lock()
+        # the futures of the computations submitted on each graph object, keyed by its id
+        self._futures: Dict[Tuple[int, str], Tuple[nx.Graph, Future]] = {}
+        # the fingerprint of each graph object and the results of each graph version
+        self._fingerprints: Dict[int, Tuple[nx.Graph, str]] = {}
+        self._results: Dict[Tuple[str, str], Any] = {}
+
+    def fingerprint(self, graph: nx.Graph) -> str:
+        """
+        Fingerprint a graph, only once for each graph object.
+
+        :param graph: The graph to fingerprint, which must not change once fingerprinted.
+        """
+        if id(graph) not in self._fingerprints:
+            self._fingerprints[id(graph)] = (graph, graph_fingerprint(graph))
+        return self._fingerprints[id(graph)][1]
+
+    def _compute(self, graph: nx.Graph, name: str, compute: Callable[[nx.Graph], Any]) -> Any:
+        key = (self.fingerprint(graph), name)
+        if key not in self._results:
+            self._results[key] = compute(graph)
+        return self._results[key]
+
+    def submit(self, graph: nx.Graph, name: str, compute: Callable[[nx.Graph], Any]) -> Future:
+        """
+        Start a computation on a graph in the background, unless it was already started.
+
+        :param graph: The graph to compute on, which must not change once submitted.
+        :param name: The name identifying the computation.
+        :param compute: The function computing the result from the graph.
+        :return: The future of the result.
+        """
+        with self._lock:
+            if (id(graph), name) not in self._futures:
+                future = self._executor.submit(self._compute, graph, name, compute)
+                self._futures[(id(graph), name)] = (graph, future)
+            return self._futures[(id(graph), name)][1]
+
+    def get(self, graph: nx.Graph, name: str, compute: Callable[[nx.Graph], Any]) -> Any:
+        """
+        Get the result of a computation on a graph, waiting for it if it is still running.
+
+        :param graph: The graph to compute on, which must not change once submitted.
+        :param name: The name identifying the computation.
+        :param compute: The function computing the result from the graph.
+        """
+        return self.submit(graph, name, compute).result()
+
+    def shutdown(self):
+        """Cancel the computations that have not started yet."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _with_rendering_properties(component: dict, properties: dict) -> dict:
+    """Copy the dictionary of a node or edge with its rendering properties updated."""
+    meta = component.get('meta') or {}
+    return {
+        **component,
+        'meta': {
+            **meta,
+            'rendering_properties': {
+                **meta.get('rendering_properties', {}),
+                **properties,
+            },
+        },
+    }
+
+
+class StyledGraph:
+    """
+    A CausalGraph with the rendering properties of some of its nodes and edges overridden.
+
+    The graph itself is neither copied nor changed: the overrides are kept aside as a small diff
+    and only applied to the dictionary representation of the graph when it is serialized for the
+    `CausalGraphViewer`. The dictionary representation of the graph is computed once and shared
+    by every StyledGraph of the graph, so the graph must not change once it has been styled.
+    """
+
+    def __init__(self, graph: CausalGraph):
+        """
+        :param graph: The graph to style.
+        """
+        self.graph = graph
+        self.node_styles: Dict[str, dict] = {}
+        self.edge_styles: Dict[Tuple[str, str], dict] = {}
+
+    def style_node(self, identifier: str, **properties):
+        """
+        Override rendering properties of a node, e.g. its color or label_color.
+
+        :param identifier: The identifier of the node.
+        """
+        self.node_styles.setdefault(identifier, {}).update(properties)
+
+    def style_nodes(self, identifiers: Sequence[str], **properties):
+        """
+        Override rendering properties of many nodes at once.
+        Each property is given either as an array with one value per node, e.g. the color of each
+        node, or as a single value for every node.
+
+        :param identifiers: The identifiers of the nodes.
+        """
+        columns = {
+            name: np.asarray(value).tolist()
+            if isinstance(value, (list, tuple, np.ndarray, pd.Series))
+            else [value] * len(identifiers)
+            for name, value in properties.items()
+        }
+        names = list(columns)
+        if self.node_styles.keys().isdisjoint(identifiers):
+            # none of the nodes is styled yet, so their styles are created in a single pass
+            self.node_styles.update(
+                (identifier, dict(zip(names, values)))
+                for identifier, values in zip(identifiers, zip(*columns.values()))
+            )
+        else:
+            for identifier, values in zip(identifiers, zip(*columns.values())):
+                self.node_styles.setdefault(identifier, {}).update(zip(names, values))
+
+    def style_edge(self, node_1: str, node_2: str, **properties):
+        """
+        Override rendering properties of the edge between two nodes, whichever its direction.
+        Nothing is styled if the nodes are not connected.
+
+        :param node_1: The identifier of one end of the edge.
+        :param node_2: The identifier of the other end of the edge.
+        """
+        if self.graph.edge_exists(node_1, node_2):
+            self.edge_styles.setdefault((node_1, node_2), {}).update(properties)
+        elif self.graph.edge_exists(node_2, node_1):
+            self.edge_styles.setdefault((node_2, node_1), {}).update(properties)
+
+    def to_dict(self) -> dict:
+        """
+        Serialize the graph with its overrides applied.
+
+        Only the nodes and edges overridden are copied, every other entry is shared with the
+        dictionary representation of the graph.
+        """
+        if id(self.graph) not in _GRAPH_DICTS:
+            _GRAPH_DICTS[id(self.graph)] = (self.graph, self.graph.to_dict())
+        graph_dict = _GRAPH_DICTS[id(self.graph)][1]
+
+        nodes = dict(graph_dict['nodes'])
+        for identifier, properties in self.node_styles.items():
+            nodes[identifier] = _with_rendering_properties(nodes[identifier], properties)
+
+        edges = dict(graph_dict['edges'])
+        for (source, destination), properties in self.edge_styles.items():
+            edges[source] = {
+                **edges[source],
+                destination: _with_rendering_properties(
+                    edges[source][destination], properties
+                ),
+            }
+
+        return {**graph_dict, 'nodes': nodes, 'edges': edges}
+
+    @classmethod
+    def from_dict(cls, graph_dict: dict) -> 'StyledGraph':
+        """
+        Deserialize a graph, its styles being part of the graph from then on.
+
+        :param graph_dict: The dictionary representation of the graph.
+        """
+        return cls(CausalGraph.from_dict(graph_dict))
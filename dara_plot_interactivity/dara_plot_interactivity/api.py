@@ -0,0 +1,42 @@
+"""
+Copyright 2023 Impulse Innovations Limited
+
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from dara.core.http import get
+
+from dara_plot_interactivity.definitions import COUNTRY_PATCHES, GEOMETRY_ROUTE
+
+
+@get(f'{GEOMETRY_ROUTE}/{{detail}}', authenticated=False)
+async def country_geometry(detail: str) -> Response:
+    """
+    Serves the patches of the countries on the world map at the given level of detail.
+
+    The borders never change while the app runs, so browsers are allowed to cache them and only download them the
+    first time a map at this level of detail is shown.
+
+    :param detail: the level of detail of the country geometry, one of MAP_DETAIL_LEVELS
+    :return: the JSON of the patches
+    """
+    if detail not in COUNTRY_PATCHES:
+        raise HTTPException(status_code=404, detail=f'Unknown level of detail: {detail}')
+    return Response(
+        content=COUNTRY_PATCHES[detail],
+        media_type='application/json',
+        headers={'Cache-Control': 'public, max-age=86400'},
+    )
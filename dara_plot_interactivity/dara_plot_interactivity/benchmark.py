@@ -0,0 +1,261 @@
+"""
+Copyright 2023 Impulse Innovations Limited
+
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Headless benchmark of the plots on the Plot Interactivity page.
+
+Run from the root directory of the project with:
+
+    DATA_ROOT=./data poetry run python -m dara_plot_interactivity.benchmark
+
+The world map, bar chart and time series plot are measured on the GDP data for every feature, year and level of
+the page, calling the body of each py_component of PlotInteractivityPage directly, exactly as Dara does when the
+selection changes, including building the Bokeh document shipped to the browser. The map is measured both with its
+caches cleared and warm.
+
+To see how each stage scales, the data is then split into synthetic sub-national regions, and the stages that do not
+depend on the country borders are measured on the regions: indexing the data, rolling the regions up to countries
+(which is what a regional map would need), the bar chart and the time series plot.
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dara.components import Bokeh
+
+from dara_plot_interactivity.data_store import IndexedData, aggregate_panel
+from dara_plot_interactivity.definitions import (
+    AREA_FEATURE, CONTINENT_FEATURE, DEFAULT_MAP_DETAIL, INDEXED_DATA, LEVEL_DATA, PLOT_FEATURES,
+    POPULATION_FEATURE, SUMMED_FEATURES, WEIGHTED_FEATURES, YEAR_FEATURE
+)
+from dara_plot_interactivity.plot_interactivity import PlotInteractivityPage
+from dara_plot_interactivity.plotting_utils import map_data, timeseries_plot, top_ten_countries_barplot
+
+# the features the map can color countries by, the others are not numeric
+NUMERIC_FEATURES = [
+    feature for feature in PLOT_FEATURES
+    if pd.api.types.is_numeric_dtype(INDEXED_DATA.year(INDEXED_DATA.years[0])[feature])
+]
+
+DEFAULT_SELECTION_SIZES = [1, 10, 100, 1000]
+DEFAULT_REGIONS = [1, 10, 100]
+
+
+def scaled_panel(data: pd.DataFrame, regions: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Splits every country of the GDP data into synthetic regions.
+
+    The population of a country is shared randomly between its regions, while the GDP per capita and the life
+    expectancy of each region vary randomly around those of the country. Each region keeps the continent and codes
+    of its country.
+
+    :param data: the GDP data with one row per country and year
+    :param regions: the number of regions of each country
+    :param seed: seed of the random variations
+    :return: DataFrame with the columns of the data and one row per region and year
+    """
+    if regions == 1:
+        return data.reset_index(drop=True)
+
+    rng = np.random.default_rng(seed)
+    scaled = data.loc[data.index.repeat(regions)].reset_index(drop=True)
+    region = np.tile(np.arange(regions), len(data))
+    scaled[AREA_FEATURE] = scaled[AREA_FEATURE] + ' / region ' + (region + 1).astype(str)
+
+    shares = rng.dirichlet(np.ones(regions), size=len(data)).ravel()
+    scaled[POPULATION_FEATURE] = np.maximum((scaled[POPULATION_FEATURE] * shares).round(), 1).astype('int64')
+    scaled['gdpPercap'] = scaled['gdpPercap'] * rng.lognormal(0, 0.3, len(scaled))
+    scaled['lifeExp'] = scaled['lifeExp'] + rng.normal(0, 2, len(scaled))
+    return scaled
+
+
+def measure(
+    interaction: Callable[[], object],
+    repeats: int,
+    setup: Optional[Callable[[], None]] = None,
+) -> Dict[str, float]:
+    """
+    Measures the latency, memory allocated and payload of an interaction.
+
+    Latencies are timed with tracing disabled, then the interaction is run once more under tracemalloc so that the
+    tracing overhead does not skew the timings.
+
+    :param interaction: the interaction to measure, returning the component or figure it builds
+    :param repeats: the number of timed runs
+    :param setup: function run before each run of the interaction and not timed, e.g. to clear caches
+    :return: dictionary with the p50 and p95 latency in milliseconds, the peak allocations in MiB and the size of the
+        Bokeh document sent to the browser in KiB
+    """
+    latencies = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        interaction()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    result = interaction()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50 (ms)': np.percentile(latencies, 50),
+        'p95 (ms)': np.percentile(latencies, 95),
+        'peak alloc (MiB)': peak / 2**20,
+        'payload (KiB)': len(result.document) / 2**10 if isinstance(result, Bokeh) else np.nan,
+    }
+
+
+def run_page_benchmark(features: List[str], sizes: List[int], repeats: int) -> pd.DataFrame:
+    """
+    Measures the plots of the page on the GDP data for every feature, year and level.
+
+    :param features: the features to measure
+    :param sizes: the numbers of selected countries of the time series plot, capped at the number of countries
+    :param repeats: the number of timed runs of each interaction
+    :return: DataFrame with one row per interaction
+    """
+    page = PlotInteractivityPage()
+    world_map = PlotInteractivityPage.display_interactive_world_map.__wrapped__
+    bar_plot = PlotInteractivityPage.display_bar_plot.__wrapped__
+    timeseries = PlotInteractivityPage.display_timeseries_plot.__wrapped__
+
+    def _clear_caches():
+        map_data.cache_clear()
+        for data in LEVEL_DATA.values():
+            data._rankings.clear()
+
+    results = []
+    for feature in features:
+        for level in LEVEL_DATA:
+            for year in INDEXED_DATA.years:
+                params = f'{feature}, {year}, {level}'
+                results.append({
+                    'stage': 'world_map (cold)',
+                    'params': params,
+                    **measure(lambda: world_map(page, feature, year, DEFAULT_MAP_DETAIL, level), repeats,
+                              setup=_clear_caches),
+                })
+                results.append({
+                    'stage': 'world_map',
+                    'params': params,
+                    **measure(lambda: world_map(page, feature, year, DEFAULT_MAP_DETAIL, level), repeats),
+                })
+                results.append({
+                    'stage': 'bar_plot',
+                    'params': params,
+                    **measure(lambda: bar_plot(page, feature, year, level), repeats),
+                })
+
+        areas = INDEXED_DATA.timeseries(feature).columns.tolist()
+        for size in sizes:
+            countries = areas[:size]
+            results.append({
+                'stage': f'timeseries_plot ({len(countries)} areas)',
+                'params': feature,
+                **measure(lambda: timeseries(page, countries, feature), repeats),
+            })
+
+    return pd.DataFrame(results).assign(regions=1)
+
+
+def run_scaling_benchmark(regions: List[int], features: List[str], sizes: List[int], repeats: int) -> pd.DataFrame:
+    """
+    Measures the stages that do not depend on the country borders on the GDP data split into synthetic regions.
+
+    :param regions: the numbers of regions of each country
+    :param features: the features to measure
+    :param sizes: the numbers of selected regions of the time series plot, capped at the number of regions
+    :param repeats: the number of timed runs of each interaction
+    :return: DataFrame with one row per interaction
+    """
+    year = INDEXED_DATA.years[-1]
+    gdp = pd.concat(INDEXED_DATA.scan(), ignore_index=True)
+
+    results = []
+    for n_regions in regions:
+        data = scaled_panel(gdp, n_regions)
+        results.append({
+            'regions': n_regions,
+            'stage': 'IndexedData',
+            'params': f'{len(data)} rows',
+            **measure(lambda: IndexedData(data, AREA_FEATURE, YEAR_FEATURE), repeats),
+        })
+        by_country = data.assign(country=data[AREA_FEATURE].str.split(' / ').str[0])
+        results.append({
+            'regions': n_regions,
+            'stage': 'aggregate_panel (countries)',
+            'params': f'{len(data)} rows',
+            **measure(lambda: aggregate_panel(by_country, AREA_FEATURE, YEAR_FEATURE, 'country', POPULATION_FEATURE,
+                                              SUMMED_FEATURES, WEIGHTED_FEATURES), repeats),
+        })
+        results.append({
+            'regions': n_regions,
+            'stage': 'aggregate_panel (continents)',
+            'params': f'{len(data)} rows',
+            **measure(lambda: aggregate_panel(data, AREA_FEATURE, YEAR_FEATURE, CONTINENT_FEATURE, POPULATION_FEATURE,
+                                              SUMMED_FEATURES, WEIGHTED_FEATURES), repeats),
+        })
+
+        indexed = IndexedData(data, AREA_FEATURE, YEAR_FEATURE)
+        areas = indexed.timeseries(NUMERIC_FEATURES[0]).columns.tolist()
+        for feature in features:
+            results.append({
+                'regions': n_regions,
+                'stage': 'bar_plot (cold)',
+                'params': f'{feature}, {year}',
+                **measure(lambda: Bokeh(top_ten_countries_barplot(indexed, feature, year)), repeats,
+                          setup=indexed._rankings.clear),
+            })
+            for size in sizes:
+                selection = areas[:size]
+                results.append({
+                    'regions': n_regions,
+                    'stage': f'timeseries_plot ({len(selection)} areas)',
+                    'params': feature,
+                    **measure(lambda: Bokeh(timeseries_plot(indexed, selection, feature)), repeats),
+                })
+
+    return pd.DataFrame(results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the plots on the Plot Interactivity page.')
+    parser.add_argument('--features', nargs='+', default=NUMERIC_FEATURES, help='features to plot')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SELECTION_SIZES,
+                        help='numbers of countries or regions selected on the time series plot')
+    parser.add_argument('--regions', type=int, nargs='+', default=DEFAULT_REGIONS,
+                        help='numbers of synthetic regions each country is split into')
+    parser.add_argument('--repeats', type=int, default=5, help='number of timed runs of each interaction')
+    parser.add_argument('--summary', action='store_true',
+                        help='report the mean of each stage over the features and years rather than every run')
+    args = parser.parse_args()
+
+    report = pd.concat([
+        run_page_benchmark(args.features, args.sizes, args.repeats),
+        run_scaling_benchmark(args.regions, args.features, args.sizes, args.repeats),
+    ], ignore_index=True)[['regions', 'stage', 'params', 'p50 (ms)', 'p95 (ms)', 'peak alloc (MiB)', 'payload (KiB)']]
+    if args.summary:
+        report = report.groupby(['regions', 'stage'], sort=False).mean(numeric_only=True).reset_index()
+
+    with pd.option_context('display.max_rows', None, 'display.width', None, 'display.float_format', '{:.2f}'.format):
+        print(report.to_string(index=False))
@@ -0,0 +1,439 @@
+"""
+Copyright 2023 Impulse Innovations Limited
+
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+import os
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+
+def _group_slices(values: np.ndarray) -> Dict[object, slice]:
+    """
+    Finds the rows of each value in a sorted array.
+
+    :param values: the sorted array
+    :return: dictionary of each value to the slice of its rows
+    """
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    ends = np.r_[starts[1:], len(values)]
+    return {value: slice(start, end) for value, start, end in zip(values[starts].tolist(), starts, ends)}
+
+
+def aggregate_panel(
+    data: pd.DataFrame,
+    area_feature: str,
+    year_feature: str,
+    group_feature: str,
+    weight_feature: str,
+    summed_features: List[str],
+    weighted_features: List[str],
+    total_area: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Rolls a panel dataset up from areas to groups of areas, such as from countries to continents.
+
+    Summed features are added up over the areas of each group and year, while weighted features are averaged with
+    the weight feature as weights, leaving out the areas missing either. Both are computed with a single groupby
+    over the whole dataset.
+
+    :param data: the data with one row per area and year
+    :param area_feature: the column holding the area of each row
+    :param year_feature: the column holding the year of each row
+    :param group_feature: the column holding the group of the area of each row
+    :param weight_feature: the column weighting the weighted features, such as the population
+    :param summed_features: the features added up over the areas
+    :param weighted_features: the features averaged over the areas
+    :param total_area: if given, the name of an extra area rolling up every area, such as the world
+    :return: DataFrame with the columns of the data and one row per group and year, with the group as its area and
+        the features that are neither summed nor weighted missing
+    """
+    weights = data[weight_feature]
+    totals = pd.DataFrame({feature: data[feature] for feature in summed_features})
+    for feature in weighted_features:
+        valid = data[feature].notna() & weights.notna()
+        totals[f'{feature} * weight'] = (data[feature] * weights).where(valid)
+        totals[f'{feature} weight'] = weights.where(valid)
+
+    def _rollup(keys: List[pd.Series]) -> pd.DataFrame:
+        sums = totals.groupby(keys, sort=True).sum(min_count=1)
+        rollup = sums[summed_features].copy()
+        for feature in weighted_features:
+            rollup[feature] = sums[f'{feature} * weight'] / sums[f'{feature} weight']
+        return rollup
+
+    groups = _rollup([data[group_feature].rename(area_feature), data[year_feature]]).reset_index()
+    if total_area is not None:
+        total = _rollup([data[year_feature]]).reset_index()
+        total[area_feature] = total_area
+        groups = pd.concat([groups, total], ignore_index=True)
+    return groups.reindex(columns=data.columns)
+
+
+class IndexedData:
+    """
+    Holds a panel dataset sorted both by year and by area along with the rows of each year and of each area.
+
+    Looking up the data of a year or of some areas is then a slice of the sorted data rather than a scan of the
+    whole dataset.
+    """
+
+    def __init__(self, data: pd.DataFrame, area_feature: str, year_feature: str) -> None:
+        """
+        :param data: the data with one row per area and year
+        :param area_feature: the column holding the area of each row
+        :param year_feature: the column holding the year of each row
+        """
+        self._by_year = data.sort_values([year_feature, area_feature], kind='stable').reset_index(drop=True)
+        self._year_slices = _group_slices(self._by_year[year_feature].values)
+
+        self._by_area = data.sort_values([area_feature, year_feature], kind='stable').reset_index(drop=True)
+        self._area_slices = _group_slices(self._by_area[area_feature].values)
+
+        self._init_index([*data.columns], area_feature, year_feature, [*self._year_slices], [*self._area_slices])
+
+    def _init_index(
+        self, columns: List[str], area_feature: str, year_feature: str, years: List[int], areas: List[str]
+    ) -> None:
+        """
+        Sets up the fields shared with the subclasses, however they hold the data.
+
+        :param columns: the columns of the data
+        :param area_feature: the column holding the area of each row
+        :param year_feature: the column holding the year of each row
+        :param years: the years in the data, in ascending order
+        :param areas: the areas in the data, in sorted order
+        """
+        self.columns = columns
+        self.area_feature = area_feature
+        self.year_feature = year_feature
+
+        # rankings of the areas computed so far, keyed by (feature, year)
+        self._rankings: Dict[Tuple[str, int], pd.Series] = {}
+
+        # position of each year and area along the axes of the cubes, and the cubes computed so far keyed by feature
+        self._year_positions = {year: i for i, year in enumerate(years)}
+        self._area_positions = {area: i for i, area in enumerate(areas)}
+        self._cubes: Dict[str, np.ndarray] = {}
+
+    @property
+    def years(self) -> List[int]:
+        """The years in the data, in ascending order."""
+        return [*self._year_slices]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """The number of years and of areas in the data, which is the shape of the cubes."""
+        return len(self._year_positions), len(self._area_positions)
+
+    def year(self, year: int) -> pd.DataFrame:
+        """
+        Returns the rows of a year, sorted by area.
+
+        :param year: the year to look up
+        :return: DataFrame of the rows of the year, empty if there are none
+        """
+        return self._by_year.iloc[self._year_slices.get(year, slice(0, 0))]
+
+    def areas(self, areas: List[str]) -> pd.DataFrame:
+        """
+        Returns the rows of some areas, sorted by area then year.
+
+        :param areas: the areas to look up
+        :return: DataFrame of the rows of the areas, empty if there are none
+        """
+        slices = sorted((self._area_slices[area] for area in set(areas) if area in self._area_slices),
+                        key=lambda rows: rows.start)
+        if not slices:
+            return self._by_area.iloc[0:0]
+        return self._by_area.iloc[np.concatenate([np.arange(rows.start, rows.stop) for rows in slices])]
+
+    def scan(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Goes through the data one year at a time, for processing the whole data without holding it all at once.
+
+        :param columns: the columns to return, defaults to all of them
+        :return: iterator of the DataFrame of each year, in the order of `years`
+        """
+        for year in self.years:
+            data = self.year(year)
+            yield data if columns is None else data[columns]
+
+    def ranking(self, feature: str, year: int) -> pd.Series:
+        """
+        Returns the areas ranked from the highest to the lowest value of a feature in a year.
+
+        Each ranking is sorted the first time it is requested and reused afterwards, as the data never changes.
+
+        :param feature: the feature to rank the areas by
+        :param year: the year to rank the areas in
+        :return: Series of the values of the feature indexed by area, in descending order and without missing values
+        """
+        key = (feature, year)
+        if key not in self._rankings:
+            values = self.year(year).set_index(self.area_feature)[feature].dropna()
+            self._rankings[key] = values.sort_values(ascending=False, kind='stable')
+        return self._rankings[key]
+
+    def top(self, feature: str, year: int, n: int = 10) -> pd.Series:
+        """
+        Returns the n areas with the highest value of a feature in a year.
+
+        :param feature: the feature to rank the areas by
+        :param year: the year to rank the areas in
+        :param n: the number of areas to return
+        :return: Series of the values of the feature indexed by area, in descending order
+        """
+        return self.ranking(feature, year).iloc[:n]
+
+    def cube(self, feature: str) -> np.ndarray:
+        """
+        Returns the values of a feature as a dense array with a row per year and a column per area.
+
+        Each cube is built the first time it is requested and reused afterwards, as the data never changes.
+
+        :param feature: the feature to return
+        :return: array of shape (years, areas) in the order of `years` and of the sorted areas, NaN where missing
+        """
+        if feature not in self._cubes:
+            values = self._by_year[feature]
+            cube = np.full((len(self._year_positions), len(self._area_positions)), np.nan,
+                           dtype=float if pd.api.types.is_numeric_dtype(values) else object)
+            rows = self._by_year[self.year_feature].map(self._year_positions)
+            columns = self._by_year[self.area_feature].map(self._area_positions)
+            cube[rows.values, columns.values] = values.values
+            self._cubes[feature] = cube
+        return self._cubes[feature]
+
+    def timeseries(self, feature: str, areas: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Returns the values of a feature through the years for some areas.
+
+        The values are gathered from the cube of the feature, so each area costs a column copy.
+
+        :param feature: the feature to return
+        :param areas: the areas to return, areas not in the data are left out, defaults to every area in sorted order
+        :return: DataFrame with a row per year, indexed by year, and a column per area in the order given
+        """
+        if areas is None:
+            areas = [*self._area_positions]
+        areas = [area for area in dict.fromkeys(areas) if area in self._area_positions]
+        positions = [self._area_positions[area] for area in areas]
+        return pd.DataFrame(self.cube(feature)[:, positions], index=pd.Index(self.years, name=self.year_feature),
+                            columns=areas)
+
+
+def write_partitions(data: pd.DataFrame, path: str, year_feature: str, part: int = 0) -> None:
+    """
+    Writes a panel dataset as Parquet files partitioned by year, to be read by PartitionedData.
+
+    Each year is written to its own directory, named `<year_feature>=<year>`. Data too large to be
+    loaded at once can be written in chunks, e.g. from `pd.read_csv(..., chunksize=...)`, giving each chunk its own
+    part number so that the chunks of a year are written to separate files of its directory.
+
+    :param data: the data with one row per area and year
+    :param path: the directory to write the partitions to
+    :param year_feature: the column holding the year of each row
+    :param part: the number of the file written to each year's directory
+    """
+    for year, rows in data.groupby(year_feature, sort=True):
+        directory = os.path.join(path, f'{year_feature}={year}')
+        os.makedirs(directory, exist_ok=True)
+        rows.to_parquet(os.path.join(directory, f'part-{part}.parquet'), index=False)
+
+
+class PartitionedData(IndexedData):
+    """
+    Provides the interface of IndexedData over a panel dataset stored as Parquet files partitioned by year, as
+    written by write_partitions, without loading the whole dataset into memory.
+
+    The data of a year is read from its partition only when requested, and the most recently used years are kept in
+    memory. The data of some areas, including their time series, is read with a filter on the area column. Only the
+    top areas of each ranking are kept rather than the whole ranking.
+
+    The cube of a feature holds its values for every area and year, a whole column of the dataset. It is only built
+    when it is requested or when the time series of every area are, one partition at a time reading only the area
+    and the feature, and kept afterwards. Memory use is then bounded by the years kept in memory and the cubes built
+    rather than by the whole dataset.
+    """
+
+    def __init__(self, path: str, area_feature: str, year_feature: str, cache_size: int = 8,
+                 top_size: int = 10) -> None:
+        """
+        :param path: the directory of the partitions
+        :param area_feature: the column holding the area of each row
+        :param year_feature: the column holding the year of each row
+        :param cache_size: the number of years kept in memory
+        :param top_size: the number of top areas of each ranking kept in memory
+        """
+        prefix = f'{year_feature}='
+        years = sorted(int(name[len(prefix):]) for name in os.listdir(path) if name.startswith(prefix))
+        if not years:
+            raise ValueError(f'No partitions by {year_feature} found in {path}')
+
+        self.path = path
+        self._dataset = ds.dataset(path, format='parquet')
+        self._read_year = lru_cache(maxsize=cache_size)(self._read_partition)
+        self._top_size = top_size
+
+        # the areas are gathered from the area column alone, one batch of rows at a time
+        areas = set()
+        for batch in self._dataset.to_batches(columns=[area_feature]):
+            areas.update(pc.unique(batch.column(0)).to_pylist())
+
+        self._init_index(self._dataset.schema.names, area_feature, year_feature, years, sorted(areas))
+
+    def _partition(self, year: int) -> ds.Dataset:
+        """
+        :param year: the year of the partition
+        :return: the dataset of the files of the year's partition
+        """
+        return ds.dataset(os.path.join(self.path, f'{self.year_feature}={year}'), format='parquet')
+
+    def _read_partition(self, year: int) -> pd.DataFrame:
+        """
+        :param year: the year to read
+        :return: DataFrame of the rows of the year, sorted by area
+        """
+        data = self._partition(year).to_table().to_pandas()
+        return data.sort_values(self.area_feature, kind='stable').reset_index(drop=True)
+
+    @property
+    def years(self) -> List[int]:
+        """The years in the data, in ascending order."""
+        return [*self._year_positions]
+
+    def year(self, year: int) -> pd.DataFrame:
+        """
+        Returns the rows of a year, sorted by area, reading its partition if it is not in memory.
+
+        :param year: the year to look up
+        :return: DataFrame of the rows of the year, empty if there are none
+        """
+        if year not in self._year_positions:
+            return pd.DataFrame(columns=self.columns)
+        return self._read_year(year)
+
+    def areas(self, areas: List[str]) -> pd.DataFrame:
+        """
+        Returns the rows of some areas, sorted by area then year, reading only the matching rows of each partition.
+
+        :param areas: the areas to look up
+        :return: DataFrame of the rows of the areas, empty if there are none
+        """
+        table = self._dataset.to_table(filter=ds.field(self.area_feature).isin(list(set(areas))))
+        return table.to_pandas().sort_values([self.area_feature, self.year_feature], kind='stable') \
+            .reset_index(drop=True)
+
+    def ranking(self, feature: str, year: int) -> pd.Series:
+        """
+        Returns the areas ranked from the highest to the lowest value of a feature in a year.
+
+        The ranking is sorted from the year's partition on every request rather than kept, see top.
+
+        :param feature: the feature to rank the areas by
+        :param year: the year to rank the areas in
+        :return: Series of the values of the feature indexed by area, in descending order and without missing values
+        """
+        values = self.year(year).set_index(self.area_feature)[feature].dropna()
+        return values.sort_values(ascending=False, kind='stable')
+
+    def top(self, feature: str, year: int, n: int = 10) -> pd.Series:
+        """
+        Returns the n areas with the highest value of a feature in a year.
+
+        The top `top_size` areas of each (feature, year) are found the first time they are requested and reused
+        afterwards, larger tops are ranked on every request.
+
+        :param feature: the feature to rank the areas by
+        :param year: the year to rank the areas in
+        :param n: the number of areas to return
+        :return: Series of the values of the feature indexed by area, in descending order
+        """
+        if n > self._top_size:
+            return self.ranking(feature, year).iloc[:n]
+        key = (feature, year)
+        if key not in self._rankings:
+            values = self.year(year).set_index(self.area_feature)[feature].dropna()
+            if pd.api.types.is_numeric_dtype(values):
+                self._rankings[key] = values.nlargest(self._top_size, keep='first')
+            else:
+                self._rankings[key] = values.sort_values(ascending=False, kind='stable').iloc[:self._top_size].copy()
+        return self._rankings[key].iloc[:n]
+
+    def scan(self, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Goes through the data one year at a time, reading only the given columns of each partition.
+
+        :param columns: the columns to return, defaults to all of them
+        :return: iterator of the DataFrame of each year, in the order of `years`
+        """
+        for year in self.years:
+            data = self._partition(year).to_table(columns=columns).to_pandas()
+            yield data.sort_values(self.area_feature, kind='stable').reset_index(drop=True) \
+                if self.area_feature in data.columns else data
+
+    def cube(self, feature: str) -> np.ndarray:
+        """
+        Returns the values of a feature as a dense array with a row per year and a column per area.
+
+        Each cube is built the first time it is requested, reading the area and the feature of one partition at a
+        time, and reused afterwards.
+
+        :param feature: the feature to return
+        :return: array of shape (years, areas) in the order of `years` and of the sorted areas, NaN where missing
+        """
+        if feature not in self._cubes:
+            cube = np.full((len(self._year_positions), len(self._area_positions)), np.nan, dtype=self._dtype(feature))
+            for row, data in enumerate(self.scan([self.area_feature, feature])):
+                cube[row, data[self.area_feature].map(self._area_positions).values] = data[feature].values
+            self._cubes[feature] = cube
+        return self._cubes[feature]
+
+    def timeseries(self, feature: str, areas: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Returns the values of a feature through the years for some areas.
+
+        The values of every area are gathered from the cube of the feature, as are those of some areas once the cube
+        is built. Otherwise only the rows of the areas are read, with a filter on the area column, rather than
+        building the cube.
+
+        :param feature: the feature to return
+        :param areas: the areas to return, areas not in the data are left out, defaults to every area in sorted order
+        :return: DataFrame with a row per year, indexed by year, and a column per area in the order given
+        """
+        if areas is None or feature in self._cubes:
+            return super().timeseries(feature, areas)
+        areas = [area for area in dict.fromkeys(areas) if area in self._area_positions]
+        # the areas are typed like the area column, which an empty list of areas would not be
+        area_type = self._dataset.schema.field(self.area_feature).type
+        table = self._dataset.to_table(columns=[self.area_feature, self.year_feature, feature],
+                                       filter=ds.field(self.area_feature).isin(pa.array(areas, type=area_type)))
+        values = table.to_pandas().pivot(index=self.year_feature, columns=self.area_feature, values=feature)
+        return values.reindex(index=pd.Index(self.years, name=self.year_feature), columns=areas) \
+            .rename_axis(columns=None).astype(self._dtype(feature))
+
+    def _dtype(self, feature: str) -> type:
+        """
+        :param feature: the feature
+        :return: the type of the values of the feature in the cubes, float if numeric and object otherwise
+        """
+        dtype = self._dataset.schema.field(feature).type
+        return float if pa.types.is_integer(dtype) or pa.types.is_floating(dtype) else object
@@ -18,13 +18,105 @@ import os
 import json
 import pandas as pd
 
+from dara_plot_interactivity.data_store import IndexedData, PartitionedData, aggregate_panel
+from dara_plot_interactivity.geometry import geometry_to_patch, simplify_geometry
+
 DATA_ROOT = os.environ.get('DATA_ROOT', './data')
 
-DATA = pd.read_csv(os.path.join(DATA_ROOT, 'gdp.csv'), index_col=0)
+# directory of the data partitioned by year, as written by data_store.write_partitions, if set the data is read from
+# the partitions as the page needs it rather than loaded from gdp.csv, for data larger than memory
+DATA_PARTITIONS = os.environ.get('DATA_PARTITIONS')
 
-PLOT_FEATURES = [col for col in DATA.columns if col not in ['area', 'year']]
 AREA_FEATURE = 'area'
 YEAR_FEATURE = 'year'
+CONTINENT_FEATURE = 'continent'
+
+# the data indexed by year and by area, for looking up the data of a year or of some countries without scanning it
+if DATA_PARTITIONS:
+    INDEXED_DATA = PartitionedData(DATA_PARTITIONS, AREA_FEATURE, YEAR_FEATURE)
+else:
+    INDEXED_DATA = IndexedData(pd.read_csv(os.path.join(DATA_ROOT, 'gdp.csv'), index_col=0), AREA_FEATURE, YEAR_FEATURE)
+
+PLOT_FEATURES = [col for col in INDEXED_DATA.columns if col not in ['area', 'year']]
+
+
+def _area_continents() -> pd.Series:
+    # the data is gone through one year at a time, only keeping the areas not seen in the previous years, so that a
+    # single row per area is held rather than a row per area and year
+    continents = pd.Series(dtype=object, index=pd.Index([], name=AREA_FEATURE), name=CONTINENT_FEATURE)
+    for data in INDEXED_DATA.scan([AREA_FEATURE, CONTINENT_FEATURE]):
+        new = data[~data[AREA_FEATURE].isin(continents.index)].drop_duplicates(AREA_FEATURE)
+        if len(new):
+            continents = pd.concat([continents, new.set_index(AREA_FEATURE)[CONTINENT_FEATURE]])
+    return continents
+
+
+# the continent of each country, and the countries of each continent for selecting a whole continent at once
+_AREA_CONTINENTS = _area_continents()
+CONTINENT_COUNTRIES = {
+    continent: sorted(areas) for continent, areas in _AREA_CONTINENTS.groupby(_AREA_CONTINENTS).groups.items()
+}
+
+# name of the CustomJS callback adding or removing a country on the time series plot, and the largest number of
+# values (years x areas) for which the plot carries the time series of every area so that any area can be added in
+# the browser, above which it only carries those of the selected areas and new areas are added by the server
+TIMESERIES_TOGGLE = 'timeseries-toggle'
+TIMESERIES_BROWSER_MAX_VALUES = int(os.environ.get('TIMESERIES_BROWSER_MAX_VALUES', 10000))
+
+# name of the CustomJS callback showing the bar chart of another year, and the speed of the year playback
+BARPLOT_FRAME = 'barplot-frame'
+PLAYBACK_FPS = float(os.environ.get('PLAYBACK_FPS', 4))
+
+# how the features are rolled up from countries to continents and the world: population is added up while the
+# other numeric features are averaged weighted by population, the remaining features are not rolled up
+POPULATION_FEATURE = 'pop'
+SUMMED_FEATURES = [POPULATION_FEATURE]
+WEIGHTED_FEATURES = ['lifeExp', 'gdpPercap']
+WORLD = 'World'
+
+# the features of every continent and the world in every year, computed once as the data never changes, one year at a
+# time as the aggregates of a year only depend on the data of that year
+CONTINENT_DATA = IndexedData(
+    pd.concat([
+        aggregate_panel(
+            data, AREA_FEATURE, YEAR_FEATURE, CONTINENT_FEATURE, POPULATION_FEATURE, SUMMED_FEATURES,
+            WEIGHTED_FEATURES, total_area=WORLD,
+        )
+        for data in INDEXED_DATA.scan()
+    ], ignore_index=True),
+    AREA_FEATURE,
+    YEAR_FEATURE,
+)
+
+# the levels the map and bar chart can show the data at, and the data of each
+COUNTRY_LEVEL = 'Countries'
+CONTINENT_LEVEL = 'Continents'
+LEVEL_DATA = {COUNTRY_LEVEL: INDEXED_DATA, CONTINENT_LEVEL: CONTINENT_DATA}
 
 with open(os.path.join(DATA_ROOT, 'countries.json'), 'r') as f:
     COUNTRIES = json.load(f)
+
+# tolerance in metres of the simplified country geometry at each level of detail of the map
+MAP_DETAIL_LEVELS = {'High': 0, 'Medium': 20000, 'Low': 50000}
+DEFAULT_MAP_DETAIL = 'Medium'
+
+# the countries on the map, in the order of their patches in COUNTRY_PATCHES, and their continents (None if unknown)
+COUNTRY_AREAS = [country['properties'][AREA_FEATURE] for country in COUNTRIES['features']]
+COUNTRY_CONTINENTS = [_AREA_CONTINENTS.get(area) for area in COUNTRY_AREAS]
+
+
+def _country_patches(tolerance: float) -> str:
+    patches = [geometry_to_patch(simplify_geometry(country['geometry'], tolerance)) for country in COUNTRIES['features']]
+    return json.dumps({
+        AREA_FEATURE: COUNTRY_AREAS,
+        'xs': [xs for xs, _ in patches],
+        'ys': [ys for _, ys in patches],
+    })
+
+
+# the patches of the countries at each level of detail serialized to JSON once, they are served separately from the
+# map so that browsers only download them once and the map itself only carries the values of each country
+COUNTRY_PATCHES = {detail: _country_patches(tolerance) for detail, tolerance in MAP_DETAIL_LEVELS.items()}
+
+# route serving COUNTRY_PATCHES, under /api
+GEOMETRY_ROUTE = 'plot-interactivity/geometry'
@@ -0,0 +1,108 @@
+"""
+Copyright 2023 Impulse Innovations Limited
+
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def simplify_ring(ring: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplifies a closed ring of points with the Douglas-Peucker algorithm.
+
+    Points are kept when they lie further than the tolerance from the line joining the points kept around them.
+    A ring that would collapse to fewer than four points (a closed triangle) is returned unchanged so that small
+    islands do not disappear from the map.
+
+    :param ring: array of shape (n, 2) of the points of the ring, the first point repeated at the end
+    :param tolerance: the largest distance a removed point may lie from the simplified ring
+    :return: array of the points kept
+    """
+    if tolerance <= 0 or len(ring) <= 4:
+        return ring
+
+    keep = np.zeros(len(ring), dtype=bool)
+    keep[0] = keep[-1] = True
+    # the ring starts and ends on the same point, so it is split on the point furthest from it first
+    furthest = int(np.argmax(np.hypot(*(ring - ring[0]).T)))
+    keep[furthest] = True
+    stack = [(0, furthest), (furthest, len(ring) - 1)]
+
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = ring[end] - ring[start]
+        offsets = ring[start + 1:end] - ring[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(*offsets.T)
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        ind = int(np.argmax(distances))
+        if distances[ind] > tolerance:
+            split = start + 1 + ind
+            keep[split] = True
+            stack += [(start, split), (split, end)]
+
+    if keep.sum() < 4:
+        return ring
+    return ring[keep]
+
+
+def simplify_geometry(geometry: dict, tolerance: float) -> dict:
+    """
+    Simplifies a GeoJSON Polygon or MultiPolygon geometry.
+
+    The coordinates of a simplified geometry are rounded to whole units, which for the Web Mercator coordinates
+    of the map are metres, to further shrink the serialized geometry.
+
+    :param geometry: the GeoJSON geometry
+    :param tolerance: the largest distance a removed point may lie from the simplified geometry, 0 for no change
+    :return: the simplified GeoJSON geometry
+    """
+    if tolerance <= 0:
+        return geometry
+
+    def _simplify_polygon(polygon: List[list]) -> List[list]:
+        return [np.round(simplify_ring(np.asarray(ring), tolerance)).tolist() for ring in polygon]
+
+    if geometry['type'] == 'Polygon':
+        coordinates = _simplify_polygon(geometry['coordinates'])
+    else:
+        coordinates = [_simplify_polygon(polygon) for polygon in geometry['coordinates']]
+    return {'type': geometry['type'], 'coordinates': coordinates}
+
+
+def geometry_to_patch(geometry: dict) -> Tuple[List[Optional[float]], List[Optional[float]]]:
+    """
+    Converts a GeoJSON Polygon or MultiPolygon geometry to the coordinates of a single Bokeh patch.
+
+    As with Bokeh's GeoJSONDataSource, only the exterior ring of each polygon is drawn and the polygons of a
+    MultiPolygon are separated by NaN, which is written as None here so the coordinates can be serialized to JSON.
+
+    :param geometry: the GeoJSON geometry
+    :return: tuple of the x and y coordinates of the patch
+    """
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    xs, ys = [], []
+    for i, polygon in enumerate(polygons):
+        if i > 0:
+            xs.append(None)
+            ys.append(None)
+        xs += [point[0] for point in polygon[0]]
+        ys += [point[1] for point in polygon[0]]
+    return xs, ys
@@ -14,12 +14,16 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import os
+
 from dara.core.configuration import ConfigurationBuilder, Configuration
 from dara.core.visual.components import Menu, RouterContent
 from dara.core.visual.components.sidebar_frame import SideBarFrame
 from dara.core.visual.template import TemplateBuilder
 
+from dara_plot_interactivity.api import country_geometry
 from dara_plot_interactivity.plot_interactivity import PlotInteractivityPage
+from dara_plot_interactivity.plotting_utils import warm_plot_caches
 
 # Create a configuration builder
 config = ConfigurationBuilder()
@@ -42,5 +46,12 @@ def template_renderer(config: Configuration):
 config.add_template_renderer('side-bar', template_renderer)
 config.template = 'side-bar'
 
+# Serve the borders of the countries drawn on the world map
+config.add_endpoint(country_geometry)
+
+# Compute the map and ranking of every feature and year on startup unless disabled with WARM_MAP_CACHE=false
+if os.environ.get('WARM_MAP_CACHE', 'true').lower() == 'true':
+    config.on_startup(warm_plot_caches)
+
 # Register pages
 config.add_page('Plot Interactivity', PlotInteractivityPage())
\ No newline at end of file
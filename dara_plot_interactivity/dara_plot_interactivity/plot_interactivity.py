@@ -17,13 +17,18 @@ limitations under the License.
 from typing import List
 from bokeh.models import TapTool
 
-from dara.core import Variable, py_component, UpdateVariable
+from dara.core import DerivedVariable, Variable, py_component, UpdateVariable
 from dara.core.definitions import ComponentInstance
 from dara.components import Heading, Stack, Grid, Select, Text, Button, Label, Bokeh
 from dara.components.plotting import figure_events
 
-from dara_plot_interactivity.definitions import DATA, PLOT_FEATURES, YEAR_FEATURE
-from dara_plot_interactivity.plotting_utils import top_ten_countries_barplot, world_map, timeseries_plot
+from dara_plot_interactivity.definitions import (
+    CONTINENT_COUNTRIES, CONTINENT_DATA, COUNTRY_LEVEL, DEFAULT_MAP_DETAIL, INDEXED_DATA, LEVEL_DATA, MAP_DETAIL_LEVELS,
+    PLOT_FEATURES, TIMESERIES_TOGGLE
+)
+from dara_plot_interactivity.plotting_utils import (
+    named_callback_js, ships_every_timeseries, top_ten_countries_barplot, world_map, timeseries_plot, year_playback
+)
 
 
 class PlotInteractivityPage:
@@ -31,13 +36,33 @@ class PlotInteractivityPage:
         self.countries = Variable([])
         self.feature = Variable('gdpPercap')
         self.year = Variable(2007)
+        self.map_detail = Variable(DEFAULT_MAP_DETAIL)
+        self.level = Variable(COUNTRY_LEVEL)
+        self.continent = Variable()
+        self.resets = Variable(0)
+
+        # the countries the time series plot is built with, which only follow the selected countries when the
+        # feature changes or the selection is reset or replaced, as tapping the map updates the plot in the browser.
+        # When the plot does not carry the time series of every area, tapping a country that is not on the plot
+        # cannot add it in the browser, so they follow every change of the selected countries instead.
+        # It is not cached, as the cache key would only hold the feature and the count of resets, which users share
+        deps = [self.feature, self.resets]
+        if not ships_every_timeseries(INDEXED_DATA, CONTINENT_DATA):
+            deps.append(self.countries)
+        self.timeseries_countries = DerivedVariable(
+            lambda countries, feature, resets: countries,
+            variables=[self.countries, self.feature, self.resets],
+            deps=deps,
+            cache=None,
+        )
 
     def __call__(self) -> ComponentInstance:
         """
         Constructs the layout of the page.
 
         The page displays a a world heat map and bar chart based on a year and feature selected.
-        It also displays a time series plot of the feature based on the countries tapped on the world heat map.
+        It also displays a time series plot of the feature based on the countries tapped on the world heat map and the
+        continents added in the continent selector.
 
         :return: ComponentInstance
         """
@@ -46,25 +71,46 @@ class PlotInteractivityPage:
             Text('Explore the map to inspect features for each country', italic=True),
             Grid(
                 Grid.Row(
-                    Grid.Column(Label(Select(value=self.feature, items=PLOT_FEATURES), value='Column:', direction='horizontal'), span=5),
-                    Grid.Column(Label(Select(value=self.year, items=[*DATA[YEAR_FEATURE].unique()]), value='Year:', direction='horizontal'), span=5),
+                    Grid.Column(Label(Select(value=self.feature, items=PLOT_FEATURES), value='Column:', direction='horizontal'), span=2),
+                    Grid.Column(Label(Select(value=self.year, items=INDEXED_DATA.years), value='Year:', direction='horizontal'), span=2),
+                    Grid.Column(Label(Select(value=self.level, items=[*LEVEL_DATA]), value='Show:', direction='horizontal'), span=2),
+                    Grid.Column(Label(Select(value=self.map_detail, items=[*MAP_DETAIL_LEVELS]), value='Map detail:', direction='horizontal'), span=2),
+                    Grid.Column(
+                        Label(
+                            Select(
+                                value=self.continent,
+                                items=[*CONTINENT_COUNTRIES],
+                                onchange=[
+                                    UpdateVariable(self.add_continent, self.countries),
+                                    UpdateVariable(lambda ctx: ctx.inputs.old + 1, self.resets),
+                                ],
+                            ),
+                            value='Add continent:',
+                            direction='horizontal',
+                        ),
+                        span=2,
+                    ),
                     Grid.Column(
                         Button(
                             'Reset Selection',
                             icon='refresh',
-                            onclick=UpdateVariable(lambda ctx: [], self.countries),                            
+                            onclick=[
+                                UpdateVariable(lambda ctx: [], self.countries),
+                                UpdateVariable(lambda ctx: None, self.continent),
+                                UpdateVariable(lambda ctx: ctx.inputs.old + 1, self.resets),
+                            ],
                         ),
                     ),
                     height='8%',
                     column_gap=1
                 ),
                 Grid.Row(
-                    Grid.Column(self.display_interactive_world_map(self.feature, self.year)),
-                    Grid.Column(self.display_bar_plot(self.feature, self.year)),
+                    Grid.Column(self.display_interactive_world_map(self.feature, self.year, self.map_detail, self.level)),
+                    Grid.Column(self.display_bar_plot(self.feature, self.year, self.level)),
                     height='45%'
                 ),
                 Grid.Row(
-                    Grid.Column(self.display_timeseries_plot(self.countries, self.feature)),
+                    Grid.Column(self.display_timeseries_plot(self.timeseries_countries, self.feature)),
                     height='45%'
                 ),
             )
@@ -73,49 +119,64 @@ class PlotInteractivityPage:
     @staticmethod
     def update_countries(ctx):
         """
-        Adds the country clicked on in the world map to the list of the page's selected countries.
-
-        To keep the graph clean, it limits to ten selected countries. When it goes over ten, it will
-        pop the first country and replace it with the new one.
+        Adds the country clicked on in the world map to the list of the page's selected countries, or removes it if
+        it was already selected. The time series plot applies the same change in the browser.
 
         :param x: the newly selected country from the world map
         :param y: the current list of selected countries
-        :return the updated list of selected countries (at a maximum of ten countries)
+        :return the updated list of selected countries
         """
         x = ctx.inputs.new
         y = ctx.inputs.old
-        if len(y) == 10:
-            _ = y.pop(0)
         if x not in y:
             y.append(x)
         else:
             y.remove(x)
         return y
 
+    @staticmethod
+    def add_continent(ctx):
+        """
+        Adds every country of the continent chosen in the continent selector to the page's selected countries.
+
+        :param x: the chosen continent
+        :param y: the current list of selected countries
+        :return the updated list of selected countries
+        """
+        x = ctx.inputs.new
+        y = ctx.inputs.old
+        return [*dict.fromkeys(y + CONTINENT_COUNTRIES.get(x, []))]
+
     @py_component
-    def display_interactive_world_map(self, feature: str, year: int) -> ComponentInstance:
+    def display_interactive_world_map(self, feature: str, year: int, detail: str, level: str) -> ComponentInstance:
         """
         Displays a world heat map according to the feature and year selected.
 
         Adds an interactive component where the user can tap on a country in the map and have it be reflected
-        in the page's time series plot. This feature utilizes Bokeh's ability to add CustomJS callbacks.
+        in the page's time series plot. At the continent level, tapping a country selects its continent instead.
+        This feature utilizes Bokeh's ability to add CustomJS callbacks.
 
         If there's no data available for the parameters selected, a warning message is returned instead.
 
         :param feature: the variable from the data to inspect
         :param year: filter for the data by year
+        :param detail: the level of detail of the country borders, lower levels are faster to send and draw
+        :param level: the level of the data to show, countries or continents
         :return: ComponentInstance
         """
-        if DATA[DATA[YEAR_FEATURE] == year][feature].isna().all():
+        if LEVEL_DATA[level].year(year)[feature].isna().all():
             return Stack(
                 Text('No data available for this selection.'),
                 align='center'
             )
 
-        p = world_map(DATA, feature, year)
+        p = world_map(feature, year, detail, level)
 
-        # create event generator for the figure world_map
-        figure_event_generator = figure_events(p)
+        # add the year playback controls to the map, the events of the map are those of the resulting layout
+        layout = year_playback(p, feature, year, level, year_event='YEAR')
+
+        # create event generator for the layout of the world map
+        figure_event_generator = figure_events(layout)
 
         """
         Specify what should happen when the user clicks on the world map with the figure_event_generator.
@@ -123,30 +184,42 @@ class PlotInteractivityPage:
         This must be specified through a snippet of JavaScript code to execute in the browser.
         Within the code there is a cb_obj parameter that contains the object that tiggered the callback
         and there is a cb_data parameter that contains any tool-specific data. The cb_data will have access
-        to the source of the graph which is the the GeoJSONDataSource that is defined in the world_map function.
+        to the source of the graph which is the the AjaxDataSource that is defined in the world_map function.
 
         The following line will grab the index for the glyph (country) that is tapped:
         const index = cb_data.source.selected.indices[0];
 
-        You can then retrieve the name of the country by using this index in the source's data:
-        return cb_data.source.data['area'][index];
+        You can then retrieve the label of the country, its name or its continent, by using this index in the
+        source's data:
+        return cb_data.source.data['label'][index];
 
-        This is the data that was passed into the geo_source: gpd.GeoDataFrame(plot_data_with_geometry)
+        This is the data returned by the adapter of the geo_source: the country patches along with their labels and
+        values
 
         In the code snippet, there is a log statement of cb_data so that you can get a glimpse of what is happening
         by inspecting the page with developer tools and going into the console.
-        You will see the object ({geometries: {…}, source: GeoJSONDataSource}) in  the console logs
+        You will see the object ({geometries: {…}, source: AjaxDataSource}) in  the console logs
         and can inspect the object yourself.
 
+        The snippet also adds or removes the country on the time series plot directly in the browser. It looks up
+        the CustomJS callback named TIMESERIES_TOGGLE among the Bokeh documents on the page and executes it with
+        the country, which only touches the line of that country rather than rebuilding the whole plot.
+
+        The map also has a play button and slider going through the years in the browser, see year_playback.
+
         More information on Bokeh JavaScript callbacks can be found here:
         https://docs.bokeh.org/en/latest/docs/reference/models/callbacks.html#bokeh.models.CustomJS
         """
         click_event = figure_event_generator(
             event_name='CLICK',
-            code="""
+            code=f"""
                 console.log(cb_data)
                 const index = cb_data.source.selected.indices[0];
-                return cb_data.source.data['area'][index];
+                const area = cb_data.source.data['label'][index];
+
+                // toggle the country on the time series plot in place
+                {named_callback_js(TIMESERIES_TOGGLE, '{area}')}
+                return area;
             """
         )
 
@@ -156,44 +229,46 @@ class PlotInteractivityPage:
 
         # tell Dara what to do with the value returned in the code snippet when the map is clicked on
         # the Variable self.countries is updated with the value returned from the callback via self.update_countries
-        events = [('CLICK', [UpdateVariable(self.update_countries, self.countries)])]
+        # and the Variable self.year follows the year the playback settles on
+        events = [
+            ('CLICK', [UpdateVariable(self.update_countries, self.countries)]),
+            ('YEAR', [UpdateVariable(lambda ctx: ctx.inputs.new, self.year)]),
+        ]
 
-        return Bokeh(p, events=events)
+        return Bokeh(layout, events=events)
 
     @py_component
-    def display_bar_plot(self, feature: str, year: int) -> ComponentInstance:
+    def display_bar_plot(self, feature: str, year: int, level: str) -> ComponentInstance:
         """
-        Displays a Bokeh bar chart of the top ten countries according to the feature and year selected.
+        Displays a Bokeh bar chart of the top ten countries, or of the continents, according to the feature and year
+        selected.
 
         If there's no data available for the parameters selected, a warning message is returned instead.
 
         :param feature: the variable from the data to inspect
         :param year: filter for the data by year
+        :param level: the level of the data to show, countries or continents
         :return: ComponentInstance
         """
-        if DATA[DATA[YEAR_FEATURE] == year][feature].isna().all():
+        if LEVEL_DATA[level].year(year)[feature].isna().all():
             return Stack(
                 Text('No data available for this selection.'),
                 align='center'
             )
 
-        return Bokeh(top_ten_countries_barplot(DATA, feature, year))
+        return Bokeh(top_ten_countries_barplot(LEVEL_DATA[level], feature, year, level=level))
 
     @py_component
     def display_timeseries_plot(self, countries: List[str], feature: str) -> ComponentInstance:
         """
         Displays a Bokeh time series line plot of the selected feature filtered by selected countries.
 
-        If no countries have been selected, a warning message is returned instead.
+        The plot is only rebuilt when the feature changes, a continent is added or the selection is reset, countries
+        tapped on the world map are added to or removed from it in the browser. If the data is too large for the
+        plot to carry the time series of every area, the plot is also rebuilt when a country is tapped.
 
-        :param countries: filter for the data by country
+        :param countries: the countries and continents selected when the plot is built
         :param feature: the variable from the data to inspect
         :return ComponentInstance
         """
-        if countries == []:
-            return Stack(
-                Text(f"Please select countries on the map or in the selector \
-                        to view their {' '.join(feature.split('_'))} through time."),
-                align='center'
-            )
-        return Bokeh(timeseries_plot(DATA, countries, feature), width='100%')
+        return Bokeh(timeseries_plot(INDEXED_DATA, countries, feature, CONTINENT_DATA), width='100%')
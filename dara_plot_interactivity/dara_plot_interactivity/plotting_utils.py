@@ -14,86 +14,146 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-import json
 import math
-import numpy
+import os
+import numpy as np
 import pandas as pd
-from typing import List
-from pandas import json_normalize
+from functools import lru_cache
+from typing import List, Optional, Tuple
 
 from bokeh.models.formatters import NumeralTickFormatter
-from bokeh.models import ColorBar, GeoJSONDataSource, HoverTool, LinearColorMapper
+from bokeh.layouts import column, row
+from bokeh.models import (
+    AjaxDataSource, ColorBar, ColumnDataSource, CustomJS, HoverTool, LinearColorMapper, Slider, Toggle
+)
 from bokeh.palettes import RdBu
 from bokeh.plotting import figure
 
-from dara_plot_interactivity.definitions import COUNTRIES, AREA_FEATURE, YEAR_FEATURE
-
-def df_to_geojson(df, sep="."):
-    """
-    The opposite of json_normalize
-    """
-    df = df.replace(to_replace=numpy.nan, value='').replace(to_replace=numpy.NaN, value='')
-    result = []
-    for idx, row in df.iterrows():
-        parsed_row = {}
-        for col_label, v in row.items():
-            keys = col_label.split(sep)
-
-            current = parsed_row
-            for i, k in enumerate(keys):
-                if i==len(keys)-1:
-                    current[k] = v
-                else:
-                    if k not in current.keys():
-                        current[k] = {}
-                    current = current[k]
-        # save
-        result.append(parsed_row)
-
-    geojson = {
-        "type": "FeatureCollection",
-        "features": result
-    }
-    return geojson
+from dara.components.plotting import figure_events
+
+from dara_plot_interactivity.data_store import IndexedData
+from dara_plot_interactivity.definitions import (
+    BARPLOT_FRAME, CONTINENT_LEVEL, COUNTRY_AREAS, COUNTRY_CONTINENTS, COUNTRY_LEVEL, DEFAULT_MAP_DETAIL,
+    GEOMETRY_ROUTE, INDEXED_DATA, LEVEL_DATA, PLAYBACK_FPS, PLOT_FEATURES, TIMESERIES_BROWSER_MAX_VALUES,
+    TIMESERIES_TOGGLE, WORLD, AREA_FEATURE, YEAR_FEATURE
+)
+
+# maximum number of (feature, year, level) maps kept by map_data
+MAP_CACHE_SIZE = int(os.environ.get('MAP_CACHE_SIZE', 256))
+
 
-def world_map(data: pd.DataFrame, feature: str, year: int):
+@lru_cache(maxsize=MAP_CACHE_SIZE)
+def map_data(feature: str, year: int, level: str = COUNTRY_LEVEL) -> Tuple[List[Optional[float]], float, float]:
     """
-    Constructs a world map using Geopandas and Bokeh.
+    Computes the value of each country on the world map and the range of its colour scale for a feature and year.
 
-    Constructs a GeoJSONDataSource out of the data and a dictionary of countries and their coordinates.
-    Passes the GeoJSONDataSource into a Bokeh Patches model and uses a color mapper to color the countries
-    based on their values of the feature.
+    At the continent level each country takes the value of its continent.
+
+    The map only depends on the feature, year and level as the data never changes, so the result is cached and
+    shared by every user.
 
-    :param data: the data in question
     :param feature: the variable from the data to inspect
     :param year: filter for the data by year
-    :return the Bokeh figure to be plotted by the Bokeh extension
+    :param level: the level of the data to show, one of LEVEL_DATA
+    :return tuple of the values in the order of COUNTRY_AREAS (None where missing), the lowest and highest value
     """
     # select data according to feature and year
-    plot_data = data[data[YEAR_FEATURE] == year].copy()
+    areas = COUNTRY_CONTINENTS if level == CONTINENT_LEVEL else COUNTRY_AREAS
+    plot_data = LEVEL_DATA[level].year(year).set_index(AREA_FEATURE)[feature].reindex(areas)
+    values = [value if pd.notna(value) else None for value in plot_data.tolist()]
+    plot_data = plot_data.dropna()
+    return values, plot_data.min(), plot_data.max()
+
+
+def named_callback_js(name: str, data: str) -> str:
+    """
+    Returns a JavaScript snippet executing the CustomJS callback of the given name on another plot of the page.
+
+    Every plot on the page is a separate Bokeh document and re-rendering a plot creates a new document, so the most
+    recent document holding a callback of that name is the plot currently on the page.
+
+    :param name: the name of the CustomJS callback
+    :param data: JavaScript expression of the cb_data passed to the callback
+    :return the JavaScript snippet
+    """
+    return f"""
+        for (let i = Bokeh.documents.length - 1; i >= 0; i--) {{
+            const callback = Bokeh.documents[i].get_model_by_name('{name}');
+            if (callback != null) {{
+                callback.execute(cb_obj, {data});
+                break;
+            }}
+        }}
+    """
+
+
+def warm_plot_caches():
+    """
+    Computes the map and top areas of every feature, year and level up front so that no user has to wait for them.
+
+    The years are gone through one at a time, so that the data of each year is only read once when it is read from
+    partitions.
+    """
+    for year in INDEXED_DATA.years:
+        for level, data in LEVEL_DATA.items():
+            for feature in PLOT_FEATURES:
+                map_data(feature, year, level)
+                data.top(feature, year)
+
 
-    countries = json_normalize(COUNTRIES["features"])
+def world_map(feature: str, year: int, detail: str = DEFAULT_MAP_DETAIL, level: str = COUNTRY_LEVEL):
+    """
+    Constructs a world map using Bokeh.
+
+    Each country is labelled with its name, or with its continent at the continent level, which is what the
+    tooltip shows and what tapping the country selects.
 
-    # merge with the selected data
-    plot_data = plot_data.add_prefix('properties.')
-    plot_data_with_geometry = pd.merge(countries, plot_data, on=['properties.' + AREA_FEATURE], how='left')
-    
-    # convert this data into a GeoJSONDataSource to be used by the Bokeh patch (heat map)
-    geo_source = GeoJSONDataSource(geojson=json.dumps(df_to_geojson(plot_data_with_geometry)))
+    The borders of the countries are fetched by the browser from the geometry endpoint, which it caches, so the
+    figure itself only carries the value of each country. An AjaxDataSource fetches the borders once the figure is
+    shown and its adapter adds the values to them. The data source is passed into a Bokeh Patches model and a
+    color mapper colors the countries based on their values of the feature.
+
+    :param feature: the variable from the data to inspect
+    :param year: filter for the data by year
+    :param detail: the level of detail of the country geometry, one of MAP_DETAIL_LEVELS
+    :param level: the level of the data to show, one of LEVEL_DATA
+    :return the Bokeh figure to be plotted by the Bokeh extension
+    """
+    values, min_val, max_val = map_data(feature, year, level)
+    labels = COUNTRY_CONTINENTS if level == CONTINENT_LEVEL else None
+
+    # the endpoint serves the patches as JSON where NaN is not allowed, so the gaps between the polygons of a
+    # country and missing values are sent as null and turned back into NaN here
+    adapter = CustomJS(args={'values': values, 'labels': labels}, code="""
+        const to_nan = (array) => array.map((value) => value === null ? NaN : value);
+        const response = cb_data.response;
+        return {
+            area: response.area,
+            label: labels === null ? response.area : labels,
+            xs: response.xs.map(to_nan),
+            ys: response.ys.map(to_nan),
+            value: to_nan(values),
+        };
+    """)
+    geo_source = AjaxDataSource(
+        data_url=f'/api/{GEOMETRY_ROUTE}/{detail}',
+        method='GET',
+        mode='replace',
+        adapter=adapter,
+        data={AREA_FEATURE: [], 'label': [], 'xs': [], 'ys': [], 'value': []},
+    )
 
     p = figure(
         sizing_mode='stretch_both',
         height=450,
         match_aspect=True,
-        tooltips=[('Country', '@area'), ('value', '@{' + feature + '}{,}')],
+        tooltips=[('Continent' if level == CONTINENT_LEVEL else 'Country', '@label'), ('value', '@value{,}')],
         toolbar_location='above',
         tools='reset',
-        title=f"Countries by {' '.join(feature.split('_'))}",
+        title=f"{level} by {' '.join(feature.split('_'))}",
     )
 
     # create color mapper for the heat map
-    min_val = plot_data_with_geometry['properties.' + feature].min() 
-    max_val = plot_data_with_geometry['properties.' + feature].max()
     color_mapper = LinearColorMapper(palette=RdBu[11], low=min_val, high=max_val)
 
     # create a sidebar that depicts the color mapper
@@ -107,7 +167,7 @@ def world_map(data: pd.DataFrame, feature: str, year: int):
     p.add_layout(color_bar, 'right')
 
     # create the heat map
-    fill_color = {'field': feature, 'transform': color_mapper}
+    fill_color = {'field': 'value', 'transform': color_mapper}
     p.patches('xs', 'ys', fill_color=fill_color, line_color='black', line_width=0.2, source=geo_source)
 
     p.axis.visible = False
@@ -117,31 +177,127 @@ def world_map(data: pd.DataFrame, feature: str, year: int):
     return p
 
 
-def top_ten_countries_barplot(data: pd.DataFrame, feature: str, year: int):
+def year_playback(p, feature: str, year: int, level: str, year_event: str = 'YEAR'):
+    """
+    Adds a year slider and a play button to a world map, which show the map and the bar chart of other years.
+
+    The values of the map and the bars of the bar chart in every year are shipped with the plots, from the cache
+    warmed on startup, so playing through the years runs entirely in the browser at PLAYBACK_FPS frames per second
+    without waiting on the server. Each frame of the map swaps the values of its data source and the range of its
+    color mapper, and executes the BARPLOT_FRAME callback of the bar chart.
+
+    The year shown when the playback is paused or the slider is released is returned through a figure event of the
+    returned layout, so that the rest of the page can catch up with it.
+
+    :param p: the world map, as returned by world_map
+    :param feature: the variable from the data to inspect
+    :param year: the year the map is showing
+    :param level: the level of the data to show, one of LEVEL_DATA
+    :param year_event: the name of the figure event returning the year the playback settles on
+    :return the Bokeh layout of the map and its playback controls, whose figure events are to be used for the map
+    """
+    years = LEVEL_DATA[level].years
+    frames = [map_data(feature, frame_year, level) for frame_year in years]
+
+    slider = Slider(start=0, end=len(years) - 1, step=1, value=years.index(year), show_value=False,
+                    title=f'Year {year}', sizing_mode='stretch_width')
+    play = Toggle(label='Play', width=80)
+    layout = column(row(play, slider, sizing_mode='stretch_width'), p, sizing_mode='stretch_both')
+
+    show_frame = CustomJS(
+        args={
+            'source': p.select_one({'type': AjaxDataSource}),
+            'color_mapper': p.select_one({'type': LinearColorMapper}),
+            'slider': slider,
+            'years': years,
+            # sent as binary arrays, with NaN for missing values, to keep the frames small, in double precision as
+            # the hover shows the values in full, e.g. populations above the 7 digits of single precision
+            'values': [np.array(values, dtype=np.float64) for values, _, _ in frames],
+            'lows': [low for _, low, _ in frames],
+            'highs': [high for _, _, high in frames],
+        },
+        code=f"""
+            const i = slider.value;
+            const year = years[i];
+            slider.title = `Year ${{year}}`;
+            source.data = {{...source.data, value: values[i]}};
+            color_mapper.low = lows[i];
+            color_mapper.high = highs[i];
+            {named_callback_js(BARPLOT_FRAME, '{year}')}
+        """,
+    )
+    slider.js_on_change('value', show_frame)
+
+    settle = figure_events(layout)(event_name=year_event, code='return cb_data.year;')
+    settle = CustomJS(args={'slider': slider, 'years': years, 'settle': settle()}, code="""
+        settle.execute(cb_obj, {year: years[slider.value]});
+    """)
+    slider.js_on_change('value_throttled', settle)
+
+    play.js_on_change('active', CustomJS(
+        args={'slider': slider, 'play': play, 'settle': settle, 'interval': 1000 / PLAYBACK_FPS},
+        code="""
+            if (play.active) {
+                play.label = 'Pause';
+                play._playback = setInterval(() => {
+                    slider.value = (slider.value + 1) % (slider.end + 1);
+                }, interval);
+            } else {
+                play.label = 'Play';
+                clearInterval(play._playback);
+                settle.execute(play);
+            }
+        """,
+    ))
+
+    return layout
+
+
+def _bar_columns(data: IndexedData, feature: str, year: int, n: int) -> dict:
+    """
+    Computes the columns of the bar chart of a year.
+
+    :param data: the data indexed by year and area
+    :param feature: the variable from the data to inspect
+    :param year: filter for the data by year
+    :param n: the number of countries to show
+    :return: dictionary of the country, value and color of each bar
+    """
+    plot_data = data.top(feature, year, n)
+    return {
+        'country': plot_data.index.tolist(),
+        'value': plot_data.tolist(),
+        'color': [RdBu[11][i % len(RdBu[11])] for i in range(len(plot_data))],
+    }
+
+
+def top_ten_countries_barplot(data: IndexedData, feature: str, year: int, n: int = 10, level: str = COUNTRY_LEVEL):
     """
     Constructs a Bokeh bar chart of the top ten countries according to the feature and year selected.
 
-    :param data: the data in question
+    The chart also carries the bars of every other year, and a CustomJS callback named BARPLOT_FRAME which shows
+    the year given as cb_data.year, so that the year playback of the world map can step through the years in the
+    browser.
+
+    :param data: the data indexed by year and area
     :param feature: the variable from the data to inspect
     :param year: filter for the data by year
+    :param n: the number of countries to show
+    :param level: the level of the data, one of LEVEL_DATA, used to title the chart
     :return the Bokeh figure to be plotted by the Bokeh extension
     """
-
-    plot_data = data[data[YEAR_FEATURE] == year][[feature, AREA_FEATURE]].copy()
-    plot_data = plot_data.sort_values(feature, ascending=False)[[feature, AREA_FEATURE]].iloc[:10]
-    plot_data = plot_data.set_index(AREA_FEATURE)[feature]
-    plot_data = plot_data.reset_index(name='value').rename(columns={AREA_FEATURE: 'country'})
-    plot_data['color'] = RdBu[11][:len(plot_data)]
+    plot_data = _bar_columns(data, feature, year, n)
+    source = ColumnDataSource(plot_data)
 
     p = figure(
-        title=f"Top 10 countries: {' '.join(feature.split('_'))}",
-        x_range=plot_data['country'].tolist(),
+        title=f"Top {n} {level.lower()}: {' '.join(feature.split('_'))}",
+        x_range=plot_data['country'],
         sizing_mode='stretch_both',
         toolbar_location=None,
         tooltips='@country: @value{,}',
     )
 
-    p.vbar(x='country', top='value', color='white', fill_color='color', width=0.9, source=plot_data)
+    p.vbar(x='country', top='value', color='white', fill_color='color', width=0.9, source=source)
     p.xaxis.major_label_orientation = math.pi / 8
     p.xgrid.grid_line_color = None
     p.yaxis.formatter = NumeralTickFormatter(format='0.0a')
@@ -149,43 +305,169 @@ def top_ten_countries_barplot(data: pd.DataFrame, feature: str, year: int):
     p.yaxis.axis_label_text_font_size = '8pt'
     p.xaxis.major_label_text_font_size = '6pt'
 
+    frame = CustomJS(
+        name=BARPLOT_FRAME,
+        args={
+            'source': source,
+            'x_range': p.x_range,
+            'years': data.years,
+            'frames': [_bar_columns(data, feature, frame_year, n) for frame_year in data.years],
+        },
+        code="""
+            const frame = frames[years.indexOf(cb_data.year)];
+            if (frame !== undefined) {
+                x_range.factors = frame.country;
+                source.data = frame;
+            }
+        """,
+    )
+    # tagging the figure with the callback adds it to the figure's document, where the world map can look it up
+    p.tags = [frame]
+
     return p
 
 
-def timeseries_plot(data: pd.DataFrame, countries: List[str], feature: str):
+def _selection_summary(plot_data: pd.DataFrame) -> dict:
+    """
+    Summarises the selected countries in each year, which is what the time series plot shows on hover.
+
+    :param plot_data: the time series of the selected countries, with a row per year and a column per country
+    :return: dictionary of the columns of the summary: year, count, median, low and high
+    """
+    return {
+        YEAR_FEATURE: plot_data.index.values,
+        'count': plot_data.count(axis=1).values,
+        'median': plot_data.median(axis=1).values,
+        'low': plot_data.min(axis=1).values,
+        'high': plot_data.max(axis=1).values,
+    }
+
+
+def ships_every_timeseries(data: IndexedData, aggregates: Optional[IndexedData] = None) -> bool:
+    """
+    Tells whether the time series plot carries the time series of every area or only those of the selected areas.
+
+    :param data: the data indexed by year and area
+    :param aggregates: the data of the aggregates indexed by year and area, if any
+    :return True if the time series of every area, countries and aggregates, hold at most
+        TIMESERIES_BROWSER_MAX_VALUES values
+    """
+    years, areas = data.shape
+    if aggregates is not None:
+        areas += aggregates.shape[1]
+    return years * areas <= TIMESERIES_BROWSER_MAX_VALUES
+
+
+def timeseries_plot(data: IndexedData, countries: List[str], feature: str, aggregates: Optional[IndexedData] = None):
     """
     Constructs a Bokeh timeseries line plot of the selected feature filtered by selected countries.
 
-    :param data: the data in question
-    :param countries: filter for the data by country
+    All the countries are drawn by a single multi line glyph with a row per country in its data source, so that
+    hundreds of countries cost one renderer rather than one each. Rather than a tooltip listing every country, the
+    hover shows a summary of the selected countries in each year on a median line, while hovering a line names its
+    country.
+
+    The plot also holds the time series of every country, not only the selected ones, so that countries can be
+    added to or removed from the plot in the browser without rebuilding it. The figure carries a CustomJS callback,
+    named TIMESERIES_TOGGLE, which adds or removes the row of a single country given as cb_data.area and updates
+    the summary. Above TIMESERIES_BROWSER_MAX_VALUES values, see ships_every_timeseries, the plot only holds the
+    time series of the selected countries, which can still be removed in the browser, while adding a country is
+    left to rebuilding the plot.
+
+    The time series of the aggregates, such as continents, can be selected like those of countries, and the world
+    aggregate is drawn as a reference line when there is one.
+
+    :param data: the data indexed by year and area
+    :param countries: the countries to draw initially
     :param feature: the variable from the data to inspect
+    :param aggregates: the data of the aggregates indexed by year and area, if any
     :return the Bokeh figure to be plotted by the Bokeh extension
     """
-    plot_data = data[data[AREA_FEATURE].isin(countries)][[AREA_FEATURE, YEAR_FEATURE, feature]].copy()
-    plot_data = plot_data.pivot(index=[YEAR_FEATURE], columns=[AREA_FEATURE]).reset_index()
-    plot_data.columns = [col if col else YEAR_FEATURE for col in plot_data.columns.get_level_values(1).rename(None)]
+    # the areas whose time series the plot holds, every area if None
+    shipped = None if ships_every_timeseries(data, aggregates) else [*countries, WORLD]
+    plot_data = data.timeseries(feature, shipped)
+    if aggregates is not None:
+        plot_data = pd.concat([plot_data, aggregates.timeseries(feature, shipped)], axis=1)
+    series = ColumnDataSource({YEAR_FEATURE: plot_data.index.values, **plot_data.to_dict('series')})
+    countries = [country for country in dict.fromkeys(countries) if country in plot_data.columns]
+    palette = [*RdBu[11][1:]]
+
+    years = plot_data.index.values
+    lines = ColumnDataSource({
+        AREA_FEATURE: countries,
+        'xs': [years] * len(countries),
+        'ys': [plot_data[country].values for country in countries],
+        'color': [palette[i % len(palette)] for i in range(len(countries))],
+    })
+    summary = ColumnDataSource(_selection_summary(plot_data[countries]))
 
     p = figure(sizing_mode='stretch_both', title=f"{' '.join(feature.split('_'))}", toolbar_location=None)
-    lrends = []
-    for i, col in enumerate(plot_data.columns):
-        if col == YEAR_FEATURE:
-            continue
-        lrend = p.line(YEAR_FEATURE, col, legend_label=col, line_width=3, source=plot_data, color=RdBu[11][i])
-        lrends.append(lrend)
-
-    hover = HoverTool(
-        renderers=[lrend for lrend in lrends],
-        tooltips=[(f'{country}', '@{%s}{0.00}' % country) for country in countries] + [('Year', f'@{YEAR_FEATURE}')],
-        formatters={f'@{country}': 'printf' for country in countries},
+    lrend = p.multi_line('xs', 'ys', line_color='color', line_width=2, line_alpha=0.8, hover_line_width=4,
+                         hover_line_alpha=1, source=lines)
+    median = p.line(YEAR_FEATURE, 'median', line_color='black', line_dash='dashed', line_width=2, source=summary)
+    if WORLD in plot_data.columns and plot_data[WORLD].notna().any():
+        p.line(YEAR_FEATURE, WORLD, line_color='grey', line_dash='dotted', line_width=2, legend_label=WORLD,
+               source=series)
+        p.legend.location = 'top_left'
+
+    p.add_tools(HoverTool(renderers=[lrend], tooltips=[('Country', f'@{AREA_FEATURE}')], toggleable=False))
+    p.add_tools(HoverTool(
+        renderers=[median],
+        mode='vline',
+        tooltips=[
+            ('Year', f'@{YEAR_FEATURE}'),
+            ('Selected', '@count'),
+            ('Median', '@median{0,0.00}'),
+            ('Range', '@low{0,0.00} to @high{0,0.00}'),
+        ],
         toggleable=False,
+    ))
+
+    toggle = CustomJS(
+        name=TIMESERIES_TOGGLE,
+        args={'series': series, 'lines': lines, 'summary': summary, 'palette': palette},
+        code=f"""
+            const area = cb_data.area;
+            const countries = [...lines.data['{AREA_FEATURE}']];
+            const index = countries.indexOf(area);
+            if (index >= 0) {{
+                countries.splice(index, 1);
+            }} else if (series.get_column(area) != null) {{
+                countries.push(area);
+            }} else {{
+                return;
+            }}
+
+            const years = series.get_column('{YEAR_FEATURE}');
+            const ys = countries.map((country) => series.get_column(country));
+            lines.data = {{
+                '{AREA_FEATURE}': countries,
+                xs: countries.map(() => years),
+                ys: ys,
+                color: countries.map((_, i) => palette[i % palette.length]),
+            }};
+
+            const count = [], median = [], low = [], high = [];
+            for (let i = 0; i < years.length; i++) {{
+                const values = ys.map((y) => y[i]).filter((value) => !isNaN(value)).sort((a, b) => a - b);
+                const middle = Math.floor(values.length / 2);
+                count.push(values.length);
+                low.push(values.length ? values[0] : NaN);
+                high.push(values.length ? values[values.length - 1] : NaN);
+                median.push(
+                    !values.length ? NaN
+                    : values.length % 2 ? values[middle]
+                    : (values[middle - 1] + values[middle]) / 2
+                );
+            }}
+            summary.data = {{'{YEAR_FEATURE}': years, count, median, low, high}};
+        """,
     )
-    p.add_tools(hover)
+    # tagging the figure with the callback adds it to the figure's document, where the world map can look it up
+    p.tags = [toggle]
 
     p.yaxis.formatter = NumeralTickFormatter(format='0.0a')
     p.yaxis.axis_label = f"{feature.replace('_', ' ')}"
     p.yaxis.axis_label_text_font_size = '8pt'
-    p.legend.orientation = 'horizontal'
-    p.legend.location = 'top_left'
-    p.legend.click_policy = 'hide'
 
     return p